@@ -5,10 +5,189 @@ eases the stress placed on database during times of heavy load
 cache refresh intervals specfied in settings.py
 """
 
+import time
+from collections import OrderedDict
+
 from django.contrib.auth.models import Permission
 from django.contrib.sessions.models import Session
 from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, F, Count
+from django.utils import timezone
 from app.models import *
+from app.live_updates import publish_live_event
+from app.timeseries import record_confidence_sample
+from app.presence import get_online_count
+from app.generations import generation_key, get_generations, bump_generation
+from app.records import UserRecord, LectureRecord, QuizRecord, ThreadRecord, PostRecord, dump_records, load_records
+
+
+def fill_cache(key, fill, timeout):
+	# stores the value alongside the time it goes stale, the entry itself is kept a
+	# little longer so other processes can keep serving it while one refreshes
+	value = fill()
+	cache.set(key, (value, time.time() + timeout), timeout + settings.CACHE_FILL_STALE_GRACE)
+	return value
+
+def fill_cache_many(data, timeout):
+	# same as fill_cache for a dict of already computed values
+	stale_at = time.time() + timeout
+	cache.set_many(dict((key, (value, stale_at)) for key, value in data.iteritems()), timeout + settings.CACHE_FILL_STALE_GRACE)
+
+def get_fresh_cache_value(entry):
+	# value of an entry written by fill_cache, None if it is missing or stale
+	if isinstance(entry, tuple) and len(entry) == 2 and entry[1] > time.time():
+		return entry[0]
+	return None
+
+def get_or_fill_cache(key, fill, timeout):
+	# single flight cache fill, only the process holding the lease runs the query
+	lock = '%s_fill_lock' % key
+	deadline = time.time() + settings.CACHE_FILL_WAIT
+	while True:
+		entry = cache.get(key)
+		if not isinstance(entry, tuple) or len(entry) != 2:
+			# missing or written in an older format
+			entry = None
+		if entry != None and entry[1] > time.time():
+			return entry[0]
+		if cache.add(lock, True, settings.CACHE_FILL_LEASE):
+			try:
+				return fill_cache(key, fill, timeout)
+			finally:
+				cache.delete(lock)
+		if entry != None:
+			# another process is refreshing, the previous value will do until then
+			return entry[0]
+		if time.time() >= deadline:
+			# lease holder is taking too long, do not keep the request waiting
+			return fill()
+		time.sleep(settings.CACHE_FILL_WAIT_INTERVAL)
+
+################################################################################
+# write behind queues in cache
+# writers take a slot from '<name>_tail' and then store their entry under '<name>_<slot>',
+# flushers take entries from '<name>_head' onwards
+
+def take_queue_slot(name):
+	# returns the slot a writer stores its entry under, always past the head
+	tail_key = '%s_tail' % name
+	while True:
+		head = cache.get('%s_head' % name, 0)
+		# an evicted tail starts again from the head, slots at or below it would never be taken
+		cache.add(tail_key, head, None)
+		try:
+			slot = cache.incr(tail_key)
+		except ValueError:
+			# evicted between the add and the incr
+			continue
+		if slot > head:
+			return slot
+		# the tail was evicted and started again below the head, move it past the head
+		try:
+			cache.incr(tail_key, head - slot)
+		except ValueError:
+			pass
+
+def take_queue_entries(name):
+	# returns (entries, head), the entries in queue order and the head to store once they are saved
+	# taking stops at a slot that is not written yet, since its writer may still be between the
+	# incr and the set, a slot still missing after QUEUE_SLOT_WAIT seconds was evicted and is passed over
+	head = cache.get('%s_head' % name, 0)
+	tail = cache.get('%s_tail' % name, 0)
+	keys = ['%s_%s' % (name, slot) for slot in xrange(head+1, tail+1)]
+	found = cache.get_many(keys)
+	entries = []
+	for key in keys:
+		if key not in found:
+			cache.add('%s_missing' % key, time.time(), settings.QUEUE_SLOT_WAIT * 10)
+			if time.time() - cache.get('%s_missing' % key, time.time()) < settings.QUEUE_SLOT_WAIT:
+				break
+		else:
+			entries.append(found[key])
+		head += 1
+	return entries, head
+
+def queue_drained(name):
+	# True once every slot handed out has been taken and saved
+	return cache.get('%s_head' % name, 0) >= cache.get('%s_tail' % name, 0)
+
+def release_queue_entries(name, head):
+	# called once the entries returned by take_queue_entries are saved
+	old_head = cache.get('%s_head' % name, 0)
+	cache.set('%s_head' % name, head, None)
+	slots = xrange(old_head+1, head+1)
+	cache.delete_many(['%s_%s' % (name, slot) for slot in slots] + ['%s_%s_missing' % (name, slot) for slot in slots])
+
+################################################################################
+# cached records, see app/records.py
+# namespace is the model name stamped with its generation, see app/generations.py
+# each list is kept as '<namespace>_list', with every record also under '<namespace>_record_<id>'
+# and '<namespace>_<field>_index' maps of field value to ids, all written together
+
+def index_records(pairs):
+	# builds {value: [ids]} from (id, value) pairs
+	index = {}
+	for id, value in pairs:
+		index.setdefault(value, []).append(id)
+	return index
+
+def fill_record_list(namespace, record_class, timeout, indexes=()):
+	data = dump_records(record_class, record_class.model.objects.all())
+	version, rows = data
+	entries = dict(('%s_record_%s' % (namespace, row[0]), (version, [row])) for row in rows)
+	for field in indexes:
+		position = record_class.__slots__.index(field)
+		entries['%s_%s_index' % (namespace, field)] = index_records((row[0], row[position]) for row in rows)
+	fill_cache_many(entries, timeout)
+	return data
+
+def get_record_list(namespace, record_class, timeout, indexes=()):
+	fill = lambda: fill_record_list(namespace, record_class, timeout, indexes)
+	records = load_records(record_class, get_or_fill_cache('%s_list' % namespace, fill, timeout))
+	if records == None:
+		# written for an older version of the record
+		records = load_records(record_class, fill_cache('%s_list' % namespace, fill, timeout))
+	return records
+
+def get_record_index(namespace, record_class, field, timeout):
+	# only the two columns are read when the index has to be refilled on its own
+	return get_or_fill_cache('%s_%s_index' % (namespace, field), lambda: index_records(record_class.model.objects.values_list('id', field)), timeout)
+
+def get_records(namespace, record_class, ids, timeout):
+	# one get_many for the records, any that are missing are read in a single query
+	keys = dict((id, '%s_record_%s' % (namespace, id)) for id in ids)
+	entries = cache.get_many(keys.values())
+	found = {}
+	for id, key in keys.iteritems():
+		records = load_records(record_class, get_fresh_cache_value(entries.get(key)))
+		if records != None:
+			found[id] = records
+	missing = [id for id in keys if id not in found]
+	if missing:
+		version, rows = dump_records(record_class, record_class.model.objects.filter(id__in=missing))
+		fill_cache_many(dict((keys[row[0]], (version, [row])) for row in rows), timeout)
+		for row in rows:
+			found[row[0]] = [record_class(*row)]
+	return [record for id in ids for record in found.get(id, [])]
+
+def get_record(namespace, record_class, id, timeout):
+	records = get_records(namespace, record_class, [int(id)], timeout)
+	if records == []:
+		raise record_class.model.DoesNotExist('%s matching query does not exist.' % record_class.model._meta.object_name)
+	return records[0]
+
+def filter_records(namespace, record_class, timeout, **kwargs):
+	# records whose fields equal every keyword, read through the index maps
+	ids = None
+	for field, value in kwargs.iteritems():
+		matches = get_record_index(namespace, record_class, field, timeout).get(value, [])
+		ids = matches if ids == None else [id for id in ids if id in matches]
+	if ids == None:
+		return get_record_list(namespace, record_class, timeout)
+	# index and records can be filled at different times, check the records agree
+	return [l for l in get_records(namespace, record_class, ids, timeout)
+		if all(getattr(l, field) == value for field, value in kwargs.iteritems())]
 
 
 def get_user_permission():
@@ -30,10 +209,12 @@ def get_profile_permission():
 	return permission
 
 def get_session_count():
-	session_count = cache.get('session_count')
-	if session_count == None:
-		session_count = len(set([i.get_decoded().get('_auth_user_id') for i in Session.objects.all()]))
-		cache.set('session_count', session_count, settings.SESSION_CACHE_INTERVAL)
+	# users active within the presence window rather than unexpired sessions
+	session_count = get_online_count()
+	# keep the last count around to notice changes
+	if cache.get('last_session_count') != session_count:
+		cache.set('last_session_count', session_count, None)
+		publish_live_event('session_count')
 	return session_count
 
 ################################################################################
@@ -44,56 +225,273 @@ def set_user_confidence(User=None, confidence=None):
 	key = "User_confidence_%s" % (User.id)
 	cache.set(key, confidence, settings.CONFIDENCE_CACHE_INTERVAL)
 
+# cached in place of None for a user who has not voted, so they are not looked up on every request
+NO_CONFIDENCE = 'none'
+
 def get_user_confidence(User=None):
 	if User==None:
 		return None
 	key = "User_confidence_%s" % (User.id)
 	confidence = cache.get(key)
+	if confidence == None:
+		# a vote still waiting in the queue is newer than the db
+		confidence = cache.get("confidence_pending_%s" % (User.id))
 	if confidence == None:
 		try:
 			confidence = ConfidenceMeter.objects.get(User=User).confidence
-			cache.set(key, confidence, settings.CONFIDENCE_CACHE_INTERVAL)
 		except ConfidenceMeter.DoesNotExist:
 			# User has not cast a vote yet, no entry in db
-			confidence = None
-	return confidence
+			confidence = NO_CONFIDENCE
+		cache.set(key, confidence, settings.CONFIDENCE_CACHE_INTERVAL)
+	return None if confidence == NO_CONFIDENCE else confidence
+
+def queue_user_confidence(User=None, confidence=None):
+	# write behind, the vote is readable from cache straight away and
+	# persisted to the db later by flush_confidence_votes in a batch
+	if User==None or confidence==None:
+		return None
+	set_user_confidence(User=User, confidence=confidence)
+	# kept as long as the queued vote, so it is read back even once the entry above has expired
+	cache.set("confidence_pending_%s" % (User.id), confidence, settings.CONFIDENCE_QUEUE_TIMEOUT)
+	slot = take_queue_slot('confidence_queue')
+	cache.set('confidence_queue_%s' % slot, (User.id, confidence, timezone.now()), settings.CONFIDENCE_QUEUE_TIMEOUT)
+	# bound how many votes can be waiting in cache, flush early during vote storms
+	if slot - cache.get('confidence_queue_head', 0) >= settings.CONFIDENCE_FLUSH_BATCH_SIZE:
+		flush_confidence_votes()
+	else:
+		flush_confidence_votes_if_due()
+
+def flush_confidence_votes_if_due():
+	# only one process wins the add per interval
+	if cache.add('confidence_flush_due', True, settings.CONFIDENCE_FLUSH_INTERVAL):
+		flush_confidence_votes()
+
+def flush_confidence_votes():
+	# persists the latest queued vote of each user and appends every queued vote to the history
+	# returns the number of users written
+	if not cache.add('confidence_flush_lock', True, settings.CONFIDENCE_FLUSH_LOCK_TIMEOUT):
+		# another process is flushing
+		return 0
+	try:
+		queued_votes, head = take_queue_entries('confidence_queue')
+		if queued_votes == []:
+			release_queue_entries('confidence_queue', head)
+			return 0
+		latest_votes = {}
+		history = []
+		# in queue order so later votes replace earlier ones
+		for user_id, confidence, voted_on in queued_votes:
+			latest_votes[user_id] = confidence
+			history.append((user_id, confidence, voted_on))
+		lecture = get_current_lecture_object()
+		seat_locations = dict(UserProfile.objects.filter(user__in=latest_votes.keys()).values_list('user', 'seat_location'))
+		with transaction.atomic():
+			existing = set(ConfidenceMeter.objects.filter(User__in=latest_votes.keys()).values_list('User', flat=True))
+			# one update per confidence value rather than one per user
+			for confidence in set(latest_votes.values()):
+				ConfidenceMeter.objects.filter(User__in=[u for u in existing if latest_votes[u] == confidence]).update(confidence=confidence)
+			ConfidenceMeter.objects.bulk_create([ConfidenceMeter(User_id=u, confidence=c) for u, c in latest_votes.items() if u not in existing])
+			ConfidenceVote.objects.bulk_create([ConfidenceVote(User_id=u, Lecture=lecture, confidence=c, seat_location=seat_locations.get(u, SeatLocation.MIDDLE), created_on=voted_on)
+				for u, c, voted_on in history])
+		release_queue_entries('confidence_queue', head)
+		return len(latest_votes)
+	finally:
+		cache.delete('confidence_flush_lock')
+
+def reset_confidence_votes():
+	# clears every vote, both persisted and queued
+	flush_confidence_votes()
+	user_ids = list(ConfidenceMeter.objects.values_list('User', flat=True))
+	ConfidenceMeter.objects.all().delete()
+	cache.delete_many(["User_confidence_%s" % (user_id) for user_id in user_ids] + ["confidence_pending_%s" % (user_id) for user_id in user_ids])
+
+################################################################################
+
+# live counters for the confidence meter, kept in cache without expiry
+# votes apply a delta to them, a full rebuild only happens on reconciliation
+CONFIDENCE_METER_KEYS = (
+	'good_confidence_meter_data',
+	'neutral_confidence_meter_data',
+	'bad_confidence_meter_data',
+	'bad_left',
+	'bad_middle',
+	'bad_right',
+	)
+
+def get_confidence_meter_keys(confidence=None, seat_location=None):
+	# returns the counters that a single vote is tallied under
+	if confidence == 1:
+		return ['good_confidence_meter_data']
+	elif confidence == -1:
+		keys = ['bad_confidence_meter_data']
+		if seat_location == SeatLocation.LEFT:
+			keys.append('bad_left')
+		elif seat_location == SeatLocation.MIDDLE:
+			keys.append('bad_middle')
+		elif seat_location == SeatLocation.RIGHT:
+			keys.append('bad_right')
+		return keys
+	else:
+		return ['neutral_confidence_meter_data']
+
+def count_confidence_meter():
+	# full scan of the votes in the db, queued votes are not in it yet
+	confidence_meter_data = dict((key, 0) for key in CONFIDENCE_METER_KEYS)
+	for confidence, seat_location in ConfidenceMeter.objects.values_list('confidence', 'User__UserProfile__seat_location'):
+		for key in get_confidence_meter_keys(confidence=confidence, seat_location=seat_location):
+			confidence_meter_data[key] += 1
+	return confidence_meter_data
+
+def rebuild_confidence_meter():
+	# replaces the counters with a full count, only for cold caches and reconciliation
+	# the counters include queued votes, so they are only replaced once the queue is drained into the db,
+	# returns None when it was not, because another process was flushing or a slot was still being written
+	flush_confidence_votes()
+	if not queue_drained('confidence_queue'):
+		return None
+	confidence_meter_data = count_confidence_meter()
+	cache.set_many(confidence_meter_data, None)
+	return confidence_meter_data
+
+def update_confidence_meter(old_confidence=None, new_confidence=None, seat_location=None):
+	# apply the difference between a users old and new vote to the counters
+	# old_confidence of None means the user is voting for the first time
+	if old_confidence == new_confidence:
+		return
+	try:
+		for key in get_confidence_meter_keys(confidence=new_confidence, seat_location=seat_location):
+			cache.incr(key)
+		if old_confidence != None:
+			for key in get_confidence_meter_keys(confidence=old_confidence, seat_location=seat_location):
+				cache.decr(key)
+	except ValueError:
+		# counters were evicted from cache, rebuild them once this vote has been flushed with the rest of the queue
+		# if it could not be, get_confidence_meter finds them missing and tries again
+		rebuild_confidence_meter()
+
+def get_confidence_meter():
+	flush_confidence_votes_if_due()
+	confidence_meter_data = cache.get_many(CONFIDENCE_METER_KEYS)
+	if len(confidence_meter_data) != len(CONFIDENCE_METER_KEYS):
+		confidence_meter_data = rebuild_confidence_meter()
+		if confidence_meter_data == None:
+			# votes are still queued, show the db until the counters can be rebuilt
+			confidence_meter_data = count_confidence_meter()
+	record_confidence_sample(confidence_meter_data)
+	return confidence_meter_data
 
 ################################################################################
 
 def get_user_list():
-	user_list = cache.get('user_list')
-	if user_list == None:
-		user_list = User.objects.select_related().all()
-		cache.set('user_list', user_list, settings.USER_LIST_CACHE_INTERVAL)
-	return user_list
+	return get_record_list(generation_key('user', 'user'), UserRecord, settings.USER_LIST_CACHE_INTERVAL)
 
 def get_user_object(id=None):
-
-       user_obj = None
-       user_list = get_user_list()
-       try:
-               user_obj = [l for l in user_list if l.id==int(id)]
-               if user_obj == [] or user_obj == None:
-                       user_obj = user_list.get(id=id)
-               else:
-                       user_obj = user_obj[0]
-       except AttributeError:
-               user_list = User.objects.select_related().all()
-               cache.set('user_list', user_list, settings.USER_LIST_CACHE_INTERVAL)
-               user_obj = get_user_object(id=id)
-       return user_obj
+	return get_record(generation_key('user', 'user'), UserRecord, id, settings.USER_LIST_CACHE_INTERVAL).get_object()
 
 ################################################################################
 
-def filter_quizchoiceselected_list(Quiz=None, User=None):
-	if Quiz == None or User == None:
-		return []
-	key = 'Quizchoiceselected_%s_%s' % (Quiz.id, User.id)
-	quizchoiceselected_list = cache.get(key)
-	if quizchoiceselected_list == None:
-		quizchoiceselected_list = Quizchoiceselected.objects.filter(Quiz=Quiz, User=User)
-		cache.set(key, quizchoiceselected_list, settings.QUIZCHOICESELECTED_LIST_CACHE_INTERVAL)
-	return quizchoiceselected_list
+def get_answer_state_keys(user_id, quiz_ids):
+	# stamped with the generation of each quiz so editing a quiz or its choices turns them over, and with
+	# one for the user's answers to it, so a state read before a flush saved them is never read back after
+	generations = get_generations(*['quiz_%s' % quiz_id for quiz_id in quiz_ids] + ['answers_%s_%s' % (user_id, quiz_id) for quiz_id in quiz_ids])
+	return dict((quiz_id, 'answer_state_%s_%s_%s_%s' % (user_id, quiz_id, generation, answers_generation))
+		for quiz_id, generation, answers_generation in zip(quiz_ids, generations[:len(quiz_ids)], generations[len(quiz_ids):]))
+
+def get_answer_states(user, quiz_ids):
+	# the user's submissions for each quiz as (choice id, freeform answer) pairs, oldest first
+	# quizzes missing from cache are all read in one query, quizzes not answered get []
+	flush_quiz_answers_if_due()
+	keys = get_answer_state_keys(user.id, quiz_ids)
+	pending_keys = dict((quiz_id, 'quiz_answer_pending_%s_%s' % (user.id, quiz_id)) for quiz_id in quiz_ids)
+	entries = cache.get_many(keys.values() + pending_keys.values())
+	states = dict((quiz_id, entries[key]) for quiz_id, key in keys.iteritems() if key in entries)
+	missing = [quiz_id for quiz_id in quiz_ids if quiz_id not in states]
+	if missing:
+		loaded = dict((quiz_id, []) for quiz_id in missing)
+		rows = (QuizChoiceSelected.objects.filter(Q(Quiz__in=missing) | Q(QuizChoice__Quiz__in=missing), User=user.id)
+			.values_list('Quiz', 'QuizChoice__Quiz', 'QuizChoice', 'answer').order_by('id'))
+		for quiz_id, choice_quiz_id, choice_id, answer in rows:
+			# freeform answers are stored against the quiz, choices against the choice
+			loaded[quiz_id if quiz_id != None else choice_quiz_id].append((choice_id, answer))
+		cache.set_many(dict((keys[quiz_id], state) for quiz_id, state in loaded.iteritems()), settings.ANSWER_STATE_CACHE_INTERVAL)
+		states.update(loaded)
+	for quiz_id, key in pending_keys.iteritems():
+		# submissions still waiting in the queue, so the user sees their answer straight away
+		if states[quiz_id] == [] and key in entries:
+			states[quiz_id] = entries[key]
+	return states
+
+def get_answer_state(user, quiz):
+	return get_answer_states(user, [quiz.id])[quiz.id]
+
+def forget_answer_states(pairs):
+	# pairs of (user id, quiz id) whose submissions have just been saved
+	bump_generation(*['answers_%s_%s' % pair for pair in pairs])
+
+def queue_quiz_answer(user, quiz, choice_ids=None, answer=None):
+	# write behind, the submission is acknowledged once it is in the cache queue and
+	# saved to the db later by flush_quiz_answers with the rest of its batch
+	# choice_ids for a multiple choice quiz, answer for a freeform one
+	# returns False when the user has already answered the quiz
+	state = [(choice_id, None) for choice_id in choice_ids] if choice_ids else [(None, answer)]
+	if get_answer_state(user, quiz) != []:
+		return False
+	# the pending entry lets only one submission per user through, and is read back by get_answer_states
+	if not cache.add('quiz_answer_pending_%s_%s' % (user.id, quiz.id), state, settings.QUIZ_ANSWER_QUEUE_TIMEOUT):
+		return False
+	slot = take_queue_slot('quiz_answer_queue')
+	cache.set('quiz_answer_queue_%s' % slot, (user.id, quiz.id, state), settings.QUIZ_ANSWER_QUEUE_TIMEOUT)
+	# bound how many submissions can be waiting in cache, flush early when the whole room answers at once
+	if slot - cache.get('quiz_answer_queue_head', 0) >= settings.QUIZ_ANSWER_FLUSH_BATCH_SIZE:
+		flush_quiz_answers()
+	else:
+		flush_quiz_answers_if_due()
+	return True
+
+def flush_quiz_answers_if_due():
+	# only one process wins the add per interval
+	if cache.add('quiz_answer_flush_due', True, settings.QUIZ_ANSWER_FLUSH_INTERVAL):
+		flush_quiz_answers()
+
+def flush_quiz_answers():
+	# saves every queued submission with one bulk_create, returns the number of submissions saved
+	if not cache.add('quiz_answer_flush_lock', True, settings.QUIZ_ANSWER_FLUSH_LOCK_TIMEOUT):
+		# another process is flushing
+		return 0
+	try:
+		queued_answers, head = take_queue_entries('quiz_answer_queue')
+		if queued_answers == []:
+			release_queue_entries('quiz_answer_queue', head)
+			return 0
+		# kept in queue order so submission ids follow the order answers arrived in
+		submissions = OrderedDict()
+		for user_id, quiz_id, state in queued_answers:
+			# first submission wins, same as the pending entry
+			submissions.setdefault((user_id, quiz_id), state)
+		user_ids = set(user_id for user_id, quiz_id in submissions)
+		quiz_ids = set(quiz_id for user_id, quiz_id in submissions)
+		with transaction.atomic():
+			# a submission replayed after an earlier flush is not saved twice
+			existing = set((user_id, quiz_id if quiz_id != None else choice_quiz_id) for user_id, quiz_id, choice_quiz_id in
+				QuizChoiceSelected.objects.filter(Q(Quiz__in=quiz_ids) | Q(QuizChoice__Quiz__in=quiz_ids), User__in=user_ids)
+				.values_list('User', 'Quiz', 'QuizChoice__Quiz'))
+			saved = [((user_id, quiz_id), state) for (user_id, quiz_id), state in submissions.iteritems() if (user_id, quiz_id) not in existing]
+			QuizChoiceSelected.objects.bulk_create([QuizChoiceSelected(User_id=user_id, QuizChoice_id=choice_id, answer=answer, Quiz_id=quiz_id if choice_id == None else None)
+				for (user_id, quiz_id), state in saved
+				for choice_id, answer in state])
+		release_queue_entries('quiz_answer_queue', head)
+		# only submissions that were not already in the db are counted
+		for (user_id, quiz_id), state in saved:
+			record_quiz_answer(quiz_id, [choice_id for choice_id, answer in state])
+		# states are turned over before the pending entries are dropped so readers never see neither
+		forget_answer_states(submissions.keys())
+		cache.delete_many(['quiz_answer_pending_%s_%s' % pair for pair in submissions])
+		# the submissions are now in the db, so the results page can list them
+		for quiz_id in quiz_ids:
+			publish_live_event('quiz_answer', {'quiz': quiz_id})
+		return len(submissions)
+	finally:
+		cache.delete('quiz_answer_flush_lock')
 
 ################################################################################
 
@@ -101,154 +499,133 @@ def filter_quizchoice_list(Quiz=None):
 	if Quiz == None:
 		return []
 	key = 'Quizchoice_%s' % (Quiz.id)
-	quizchoice_list = cache.get(key)
-	if quizchoice_list == None:
-		quizchoice_list = QuizChoice.objects.filter(Quiz=Quiz)
-
-		cache.set(key, quizchoice_list, settings.QUIZCHOICE_LIST_CACHE_INTERVAL)
-	return quizchoice_list
+	key = generation_key(key, 'quiz_%s' % Quiz.id)
+	return get_or_fill_cache(key, lambda: QuizChoice.objects.filter(Quiz=Quiz), settings.QUIZCHOICE_LIST_CACHE_INTERVAL)
 
 def filter_quizchoice_list_for_correct(Quiz=None, correct=None):
 	if Quiz == None:
 		return []
-	key = 'Quizchoice_%s' % (Quiz.id)
-	quizchoice_list = filter_quizchoice_list(Quiz=Quiz)
+	# filtered from the generation keyed choice list, so editing the quiz or its choices turns it over too
+	return [l for l in filter_quizchoice_list(Quiz=Quiz) if l.correct==correct]
+
+
+def get_live_quiz_results_namespace(quiz_id):
+	return generation_key('quiz_results_live_%s' % quiz_id, 'quiz_%s' % quiz_id)
+
+def seed_live_quiz_results(namespace, quiz_id):
+	# one GROUP BY over the submissions of a quiz, every choice gets a counter and None counts freeform answers
+	# flush_quiz_answers saves and counts answers under its lock, so counters seeded under the same lock
+	# neither miss nor double count an answer, while a flush is running the counts are returned but not kept
+	locked = cache.add('quiz_answer_flush_lock', True, settings.QUIZ_ANSWER_FLUSH_LOCK_TIMEOUT)
 	try:
-		filtered_quizchoice_list = [l for l in quizchoice_list if l.correct==correct]
-		
-	except AttributeError:
-		quizchoice_list = QuizChoice.objects.select_related().all()
-		cache.set('quizchoice_list', quizchoice_list, settings.QUIZCHOICE_LIST_CACHE_INTERVAL)
-		filtered_quizchoice_list = quizchoice_list.filter(Quiz=Quiz)
-	return filtered_quizchoice_list
+		choice_ids = list(QuizChoice.objects.filter(Quiz=quiz_id).values_list('id', flat=True)) + [None]
+		counts = dict(QuizChoiceSelected.objects.filter(Q(Quiz=quiz_id) | Q(QuizChoice__Quiz=quiz_id))
+			.values_list('QuizChoice').annotate(Count('id')).order_by())
+		counts = dict((choice_id, counts.get(choice_id, 0)) for choice_id in choice_ids)
+		if locked:
+			cache.set_many(dict(('%s_%s' % (namespace, choice_id), count) for choice_id, count in counts.iteritems()), settings.QUIZ_RESULTS_COUNTER_TIMEOUT)
+			cache.set('%s_choices' % namespace, choice_ids, settings.QUIZ_RESULTS_COUNTER_TIMEOUT)
+	finally:
+		if locked:
+			cache.delete('quiz_answer_flush_lock')
+	return counts
+
+def get_live_quiz_results(quiz_id):
+	# per choice submission counts with their total and max, read from counters that record_quiz_answer keeps up to date
+	# counters are reseeded from the database when they expire, so a missed increment does not last
+	namespace = get_live_quiz_results_namespace(quiz_id)
+	choice_ids = cache.get('%s_choices' % namespace)
+	counts = None
+	if choice_ids != None:
+		entries = cache.get_many(['%s_%s' % (namespace, choice_id) for choice_id in choice_ids])
+		if len(entries) == len(choice_ids):
+			counts = dict((choice_id, entries['%s_%s' % (namespace, choice_id)]) for choice_id in choice_ids)
+	if counts == None:
+		counts = seed_live_quiz_results(namespace, quiz_id)
+	return {
+		'counts': counts,
+		'total': sum(counts.values()),
+		'max': max(counts.values()),
+	}
+
+def record_quiz_answer(quiz_id, choice_ids):
+	# choice_ids are the choices of a submission just saved, [None] for a freeform answer
+	namespace = get_live_quiz_results_namespace(quiz_id)
+	for choice_id in choice_ids:
+		try:
+			cache.incr('%s_%s' % (namespace, choice_id))
+		except ValueError:
+			# counters not seeded or expired, the next read counts this answer from the database, where it already is
+			pass
 
+def get_quiz_submissions(quiz_id, cursor=0):
+	# submissions added after the cursor, oldest first, the cursor is the id of the last one a client has
+	flush_quiz_answers_if_due()
+	return list(QuizChoiceSelected.objects.filter(Q(Quiz=quiz_id) | Q(QuizChoice__Quiz=quiz_id), id__gt=cursor)
+		.values_list('id', 'User__username', 'QuizChoice__choice', 'answer').order_by('id')[:settings.QUIZ_RESULTS_FEED_SIZE])
 
 ################################################################################
+QUIZ_INDEXES = ('visible', 'Lecture_id')
+
 def get_quiz_list():
-	quiz_list = cache.get('quiz_list')
-	if quiz_list == None:
-		quiz_list = Quiz.objects.select_related().all()
-		cache.set('quiz_list', quiz_list, settings.QUIZ_LIST_CACHE_INTERVAL)
-	return quiz_list
+	return get_record_list(generation_key('quiz', 'quiz'), QuizRecord, settings.QUIZ_LIST_CACHE_INTERVAL, QUIZ_INDEXES)
 
 def get_quiz_object(id=None, visible=None, Lecture=None):
-	kwargs = {}
-	if id != None:
-		kwargs.update({'id':id})
-	if visible != None:
-		kwargs.update({'visible':visible})
-	if Lecture != None:
-		kwargs.update({'Lecture':Lecture})
-	quiz_obj = None
-	quiz_list = get_quiz_list()
-	try:
-		if id!=None and visible==None and Lecture==None:
-			quiz_obj = [l for l in quiz_list if l.id==int(id)]
-		elif id==None and visible!=None and Lecture==None:
-			quiz_obj = [l for l in quiz_list if l.visible==visible]
-		elif id==None and visible==None and Lecture!=None:
-			quiz_obj = [l for l in quiz_list if l.Lecture==Lecture]
-		elif id!=None and visible!=None and Lecture==None:
-			quiz_obj = [l for l in quiz_list if l.id==int(id) and l.visible==visible]
-		elif id==None and visible!=None and Lecture!=None:
-			quiz_obj = [l for l in quiz_list if l.visible==visible and l.Lecture==Lecture]
-		elif id!=None and visible==None and Lecture!=None:
-			quiz_obj = [l for l in quiz_list if l.id==int(id) and l.Lecture==Lecture]
-		else:
-			quiz_obj = quiz_list.get(**kwargs)
-
-		if quiz_obj == [] or quiz_obj == None:
-			quiz_obj = quiz_list.get(**kwargs)
-		else:
-			quiz_obj = quiz_obj[0]
-
-	except AttributeError:
-		quiz_list = Quiz.objects.select_related().all()
-		cache.set('quiz_list', quiz_list, settings.QUIZ_LIST_CACHE_INTERVAL)
-		quiz_obj = quiz_list.get(**kwargs)
-	return quiz_obj
+	quiz_obj = filter_quiz_list(id=id, visible=visible, Lecture=Lecture)
+	if quiz_obj == []:
+		kwargs = {}
+		if id != None:
+			kwargs.update({'id':id})
+		if visible != None:
+			kwargs.update({'visible':visible})
+		if Lecture != None:
+			kwargs.update({'Lecture':Lecture})
+		# not in the cached list yet, raises DoesNotExist if it really is missing
+		return Quiz.objects.get(**kwargs)
+	return quiz_obj[0].get_object()
 
 def filter_quiz_list(id=None, visible=None, Lecture=None):
-	kwargs = {}
 	if id != None:
-		kwargs.update({'id':id})
+		quiz_list = get_records(generation_key('quiz', 'quiz'), QuizRecord, [int(id)], settings.QUIZ_LIST_CACHE_INTERVAL)
+		return [l for l in quiz_list if (visible==None or l.visible==visible) and (Lecture==None or l.Lecture_id==Lecture.id)]
+	kwargs = {}
 	if visible != None:
 		kwargs.update({'visible':visible})
 	if Lecture != None:
-		kwargs.update({'Lecture':Lecture})
-	filtered_quiz_list = None
-	quiz_list = get_quiz_list()
-	try:
-
-		if id!=None and visible==None and Lecture==None:
-			filtered_quiz_list = [l for l in quiz_list if l.id==int(id)]
-		elif id==None and visible!=None and Lecture==None:
-			filtered_quiz_list = [l for l in quiz_list if l.visible==visible]
-		elif id==None and visible==None and Lecture!=None:
-			filtered_quiz_list = [l for l in quiz_list if l.Lecture==Lecture]
-		elif id!=None and visible!=None and Lecture==None:
-			filtered_quiz_list = [l for l in quiz_list if l.id==int(id) and l.visible==visible]
-		elif id==None and visible!=None and Lecture!=None:
-			filtered_quiz_list = [l for l in quiz_list if l.visible==visible and l.Lecture==Lecture]
-		elif id!=None and visible==None and Lecture!=None:
-			filtered_quiz_list = [l for l in quiz_list if l.id==int(id) and l.Lecture==Lecture]
-		else:
-			filtered_quiz_list = quiz_list.filter(**kwargs)
-		
-	except AttributeError:
-		quiz_list = Quiz.objects.select_related().all()
-		cache.set('quiz_list', quiz_list, settings.QUIZ_LIST_CACHE_INTERVAL)
-		filtered_quiz_list = quiz_list.filter(**kwargs)
-	return filtered_quiz_list
+		kwargs.update({'Lecture_id':Lecture.id})
+	return filter_records(generation_key('quiz', 'quiz'), QuizRecord, settings.QUIZ_LIST_CACHE_INTERVAL, **kwargs)
 ################################################################################
 def get_lecture_list():
-    lecture_list = cache.get('lecture_list')
-    if lecture_list == None:
-        lecture_list = Lecture.objects.select_related().all()
-        cache.set('lecture_list', lecture_list, settings.LECTURE_LIST_CACHE_INTERVAL)
-    return lecture_list
+	return get_record_list(generation_key('lecture', 'lecture'), LectureRecord, settings.LECTURE_LIST_CACHE_INTERVAL)
 
 def get_lecture_object(id=None):
+	return get_record(generation_key('lecture', 'lecture'), LectureRecord, id, settings.LECTURE_LIST_CACHE_INTERVAL).get_object()
 
-	lecture_obj = None
-	lecture_list = get_lecture_list()
-	try:
-		lecture_obj = [l for l in lecture_list if l.id==int(id)]
-		if lecture_obj == [] or lecture_obj == None:
-			lecture_obj = lecture_list.get(id=id)
-		else:
-			lecture_obj = lecture_obj[0]
-	except AttributeError:
-		lecture_list = Lecture.objects.select_related().all()
-		cache.set('lecture_list', lecture_list, settings.LECTURE_LIST_CACHE_INTERVAL)
-		lecture_obj = [l for l in lecture_list if l.id==int(id)]
-		if lecture_obj == [] or lecture_obj == None:
-			lecture_obj = lecture_list.get(id=id)
-		else:
-			lecture_obj = lecture_obj[0]
-	return lecture_obj
+def set_current_lecture(Lecture=None):
+	# lecture currently being given, votes are recorded against it
+	if Lecture != None:
+		cache.set('current_lecture_id', Lecture.id, None)
+
+def get_current_lecture_object():
+	# lecture chosen in the admin quick settings, otherwise the latest lecture
+	lecture_id = cache.get('current_lecture_id')
+	if lecture_id != None:
+		try:
+			return get_lecture_object(id=lecture_id)
+		except Lecture.DoesNotExist:
+			# lecture has since been deleted
+			cache.delete('current_lecture_id')
+	return get_last_lecture_object()
 
 def get_last_lecture_object():
-	lecture_obj = None
 	lecture_list = get_lecture_list()
-	index = len(lecture_list)-1
-	if index < 0:
+	if lecture_list == []:
 		#return None if there are no Lectures
 		return None
-	try:
-		lecture_obj = lecture_list[index]
-	except AttributeError:
-		lecture_list = Lecture.objects.select_related().all()
-		cache.set('lecture_list', lecture_list, settings.LECTURE_LIST_CACHE_INTERVAL)
-		lecture_obj = lecture_list[index]
-	return lecture_obj
+	return lecture_list[-1].get_object()
 ################################################################################
 def get_lecture_materials_list():
-    lecture_materials_list = cache.get('lecture_materials_list')
-    if lecture_materials_list == None:
-        lecture_materials_list = LectureMaterial.objects.select_related().all()
-        cache.set('lecture_materials_list', lecture_materials_list, settings.LECTUREMATERIAL_LIST_CACHE_INTERVAL)
-    return lecture_materials_list
+    return get_or_fill_cache(generation_key('lecture_materials_list', 'lecturematerial'), lambda: LectureMaterial.objects.select_related().all(), settings.LECTUREMATERIAL_LIST_CACHE_INTERVAL)
 
 def filter_lecture_materials_list(Lecture=None):
 	kwargs = {}
@@ -260,19 +637,14 @@ def filter_lecture_materials_list(Lecture=None):
 		filtered_lecture_materials_list = [l for l in lecture_materials_list if l.Lecture==Lecture]
 		
 	except AttributeError:
-		lecture_materials_list = LectureMaterial.objects.select_related().all()
-		cache.set('lecture_materials_list', lecture_materials_list, settings.LECTUREMATERIAL_LIST_CACHE_INTERVAL)
+		lecture_materials_list = fill_cache(generation_key('lecture_materials_list', 'lecturematerial'), lambda: LectureMaterial.objects.select_related().all(), settings.LECTUREMATERIAL_LIST_CACHE_INTERVAL)
 		filtered_lecture_materials_list = filter_lecture_materials_list(Lecture=Lecture)
 	return filtered_lecture_materials_list
 
 ################################################################################
 
 def get_codesnippet_list():
-    codesnippet_list = cache.get('codesnippet_list')
-    if codesnippet_list == None:
-        codesnippet_list = CodeSnippet.objects.select_related().all()
-        cache.set('codesnippet_list', codesnippet_list, settings.CODESNIPPET_LIST_CACHE_INTERVAL)
-    return codesnippet_list
+    return get_or_fill_cache(generation_key('codesnippet_list', 'codesnippet'), lambda: CodeSnippet.objects.select_related().all(), settings.CODESNIPPET_LIST_CACHE_INTERVAL)
 
 def filter_codesnippet_list(Lecture=None):
 	kwargs = {}
@@ -284,80 +656,95 @@ def filter_codesnippet_list(Lecture=None):
 		filtered_codesnippet_list = [l for l in codesnippet_list if l.Lecture==Lecture]
 		
 	except AttributeError:
-		codesnippet_list = CodeSnippet.objects.select_related().all()
-		cache.set('codesnippet_list', codesnippet_list, settings.CODESNIPPET_LIST_CACHE_INTERVAL)
+		codesnippet_list = fill_cache(generation_key('codesnippet_list', 'codesnippet'), lambda: CodeSnippet.objects.select_related().all(), settings.CODESNIPPET_LIST_CACHE_INTERVAL)
 		filtered_codesnippet_list = filter_codesnippet_list(Lecture=Lecture)
 	return filtered_codesnippet_list
 
 ################################################################################
 
 def get_thread_list():
-    thread_list = cache.get('thread_list')
-    if thread_list == None:
-        thread_list = Thread.objects.select_related().all()
-        cache.set('thread_list', thread_list, settings.THREAD_LIST_CACHE_INTERVAL)
-    return thread_list
+	return get_record_list(generation_key('thread', 'thread'), ThreadRecord, settings.THREAD_LIST_CACHE_INTERVAL)
 
 def get_thread_object(id=None):
+	return get_record(generation_key('thread', 'thread'), ThreadRecord, id, settings.THREAD_LIST_CACHE_INTERVAL).get_object()
 
-	thread_obj = None
-	thread_list = get_thread_list()
+def record_thread_view(thread_id):
+	# views are counted in cache and added to the db later by flush_thread_views
+	cache.add('thread_views_%s' % thread_id, 0, settings.THREAD_VIEWS_COUNTER_TIMEOUT)
 	try:
-		thread_obj = [l for l in thread_list if l.id==int(id)]
-		if thread_obj == [] or thread_obj == None:
-			thread_obj = thread_list.get(id=id)
-		else:
-			thread_obj = thread_obj[0]
-	except AttributeError:
-		thread_list = Thread.objects.select_related().all()
-		cache.set('thread_list', thread_list, settings.THREAD_LIST_CACHE_INTERVAL)
-		thread_obj = [l for l in thread_list if l.id==int(id)]
-		if thread_obj == [] or thread_obj == None:
-			thread_obj = thread_list.get(id=id)
-		else:
-			thread_obj = thread_obj[0]
-	return thread_obj
+		views = cache.incr('thread_views_%s' % thread_id)
+	except ValueError:
+		# counter evicted between the add and the incr, losing one view is fine
+		views = None
+	if views == 1:
+		# first view since the last flush, the flush only visits threads in the queue
+		queue_viewed_thread(thread_id)
+	flush_thread_views_if_due()
+
+def queue_viewed_thread(thread_id):
+	slot = take_queue_slot('thread_views_queue')
+	cache.set('thread_views_queue_%s' % slot, thread_id, settings.THREAD_VIEWS_COUNTER_TIMEOUT)
+
+def get_pending_thread_views(thread_ids):
+	# views counted since the last flush, by thread id
+	counts = cache.get_many(['thread_views_%s' % thread_id for thread_id in thread_ids])
+	return dict((thread_id, counts.get('thread_views_%s' % thread_id, 0)) for thread_id in thread_ids)
+
+def add_pending_thread_views(thread_list):
+	# shows the saved views plus the ones still waiting in cache
+	pending = get_pending_thread_views([thread.id for thread in thread_list])
+	for thread in thread_list:
+		thread.views += pending[thread.id]
+	return thread_list
+
+def flush_thread_views_if_due():
+	# only one process wins the add per interval
+	if cache.add('thread_views_flush_due', True, settings.THREAD_VIEWS_FLUSH_INTERVAL):
+		flush_thread_views()
+
+def flush_thread_views():
+	# adds the counted views of the threads viewed since the last flush to the db,
+	# one UPDATE per distinct count rather than one save per view
+	# returns the number of threads written
+	if not cache.add('thread_views_flush_lock', True, settings.THREAD_VIEWS_FLUSH_LOCK_TIMEOUT):
+		# another process is flushing
+		return 0
+	try:
+		thread_ids, head = take_queue_entries('thread_views_queue')
+		pending = dict((thread_id, count) for thread_id, count in
+			get_pending_thread_views(set(thread_ids)).iteritems() if count > 0)
+		if not pending:
+			release_queue_entries('thread_views_queue', head)
+			return 0
+		with transaction.atomic():
+			for count in set(pending.values()):
+				Thread.objects.filter(id__in=[thread_id for thread_id in pending if pending[thread_id] == count]).update(views=F('views') + count)
+		release_queue_entries('thread_views_queue', head)
+		for thread_id, count in pending.iteritems():
+			try:
+				views = cache.decr('thread_views_%s' % thread_id, count)
+			except ValueError:
+				continue
+			if views > 0:
+				# views counted while flushing stay in the counter, queued again for next time
+				queue_viewed_thread(thread_id)
+		# cached thread records hold the old views
+		bump_generation('thread')
+		return len(pending)
+	finally:
+		cache.delete('thread_views_flush_lock')
 
 ################################################################################
 
+POST_INDEXES = ('Thread_id',)
+
 def get_post_list():
-    post_list = cache.get('post_list')
-    if post_list == None:
-        post_list = Post.objects.select_related().all()
-        cache.set('post_list', post_list, settings.POST_LIST_CACHE_INTERVAL)
-    return post_list
+	return get_record_list(generation_key('post', 'post'), PostRecord, settings.POST_LIST_CACHE_INTERVAL, POST_INDEXES)
 
 def filter_post_list(Thread=None):
-       kwargs = {}
-       if Thread != None:
-               kwargs.update({'Thread':Thread})
-       filtered_post_list = None
-       post_list = get_post_list()
-       try:
-               filtered_post_list = [l for l in post_list if l.Thread==Thread]
-               
-       except AttributeError:
-               post_list = Post.objects.select_related().all()
-               cache.set('post_list', post_list, settings.POST_LIST_CACHE_INTERVAL)
-               filtered_post_list = post_list.filter(**kwargs)
-       return filtered_post_list
+	if Thread == None:
+		return get_post_list()
+	return filter_records(generation_key('post', 'post'), PostRecord, settings.POST_LIST_CACHE_INTERVAL, Thread_id=Thread.id)
 
 def get_post_object(id=None):
-
-       post_obj = None
-       post_list = get_post_list()
-       try:
-               post_obj = [l for l in post_list if l.id==int(id)]
-               if post_obj == [] or post_obj == None:
-                       post_obj = post_list.get(id=id)
-               else:
-                       post_obj = post_obj[0]
-       except AttributeError:
-               post_list = Post.objects.select_related().all()
-               cache.set('post_list', post_list, settings.POST_LIST_CACHE_INTERVAL)
-               post_obj = [l for l in post_list if l.id==int(id)]
-               if post_obj == [] or post_obj == None:
-                       post_obj = post_list.get(id=id)
-               else:
-                       post_obj = post_obj[0]
-       return post_obj
\ No newline at end of file
+	return get_record(generation_key('post', 'post'), PostRecord, id, settings.POST_LIST_CACHE_INTERVAL).get_object()
@@ -32,7 +32,7 @@ class IndexView(TemplateView):
         
     def get_context_data(self, *args, **kwargs):
         context = super(IndexView, self).get_context_data(*args, **kwargs)
-        context['lecture_list'] = get_lecture_list()
+        context['lecture_list'] = get_lecture_list
         if context.has_key('session_key'):
             context['session_key'] = self.request.session.session_key
         return context
@@ -59,16 +59,22 @@ class LectureView(TemplateView, SidebarContextMixin):
 class QuizView(FormView, SidebarContextMixin):
     template_name = _('app/quiz.html')
 
+    def get_quiz(self):
+        # looked up once per request
+        if not hasattr(self, 'quiz'):
+            self.quiz = get_quiz_object(id=self.kwargs.get('quiz_id'))
+        return self.quiz
+
     def get_context_data(self, *args, **kwargs):
         context = super(QuizView, self).get_context_data(*args, **kwargs)
-        quiz = get_quiz_object(id=self.kwargs.get('quiz_id'))
+        quiz = self.get_quiz()
         context['code_snippet'] = quiz.render_code
         return context
 
 
     def get_form(self, data=None, files=None, *args, **kwargs):
         user = self.request.user
-        quiz = get_quiz_object(id=self.kwargs.get('quiz_id'))
+        quiz = self.get_quiz()
 
         if self.request.method == "POST":
             form = QuizSelectionForm(user, quiz, data=self.request.POST)
@@ -86,7 +92,7 @@ class QuizView(FormView, SidebarContextMixin):
         lecture_id = self.kwargs.get('lecture_id')
         quiz_id = self.kwargs.get('quiz_id')
         lecture = get_lecture_object(id=self.kwargs['lecture_id'])
-        quiz = get_quiz_object(id=self.kwargs.get('quiz_id'))
+        quiz = self.get_quiz()
 
         
         return reverse('quiz', kwargs={'lecture_id':lecture.id, 'lecture_slug':lecture.slug, 'quiz_id':quiz.id, 'quiz_slug':quiz.question})
@@ -108,7 +114,7 @@ class ThreadView(ListView, BaseSidebarContextMixin):
 
 
     def get_queryset(self, *args, **kwargs):
-        thread_list = get_thread_list()
+        thread_list = add_pending_thread_views(get_thread_list())
 
         return thread_list
 
@@ -133,6 +139,7 @@ class PostView(CreateView, BaseSidebarContextMixin):
     model = Post
 
     def dispatch(self, request, *args, **kwargs):
+        # looked up first so only threads that exist are counted, raises DoesNotExist otherwise
         get_thread_object(id=kwargs.get('thread_id')).inc_views()
         return super(PostView, self).dispatch(request, *args, **kwargs)
 
@@ -176,28 +183,31 @@ class AdminQuizResultsDetailView(TemplateView):
         quiz = get_quiz_object(id=kwargs.get('quiz_id'))
         context['quiz'] = quiz
         context['code_snippet'] = quiz.render_code
+        # make sure queued submissions are in the db before listing them
+        flush_quiz_answers()
+        results = get_live_quiz_results(quiz.id)
+        context['submission_count'] = results['total']
         quiz_type = quiz.quiz_type
         if quiz_type == QuizType.FREEFORM:
-            answers = QuizChoiceSelected.objects.select_related().filter(Quiz=quiz)
-            context['answers'] = answers
-            context['submission_count'] = answers.count()
+            submissions = list(QuizChoiceSelected.objects.select_related().filter(Quiz=quiz).order_by('id'))
+            context['answers'] = submissions
         else:
             quizchoices = filter_quizchoice_list(Quiz=quiz)
             context['quizchoices'] = quizchoices
             context['quiz_choices_summary'] = []
-            context['quiz_choices_summary_max_value'] = 0
+            context['quiz_choices_summary_max_value'] = results['max']
             for qc in quizchoices:
-                context['quiz_choices_summary'].append({'choice':qc.choice, 'times_chosen':qc.times_chosen})
-                context['quiz_choices_summary_max_value'] = max(context['quiz_choices_summary_max_value'], qc.times_chosen)
-            for qc in context['quiz_choices_summary']:
+                times_chosen = results['counts'].get(qc.id, 0)
                 try:
-                    qc['relative_percentage'] = (qc['times_chosen'] * 100/context['quiz_choices_summary_max_value'])
+                    relative_percentage = (times_chosen * 100/results['max'])
                 except ZeroDivisionError:
                     # in the event that there are no submissions, exception will occur
-                    qc['relative_percentage'] = 0
-            quizchoiceselecteds = QuizChoiceSelected.objects.select_related().filter(QuizChoice__Quiz=quiz.id)
-            context['quizchoiceselecteds'] = quizchoiceselecteds
-            context['submission_count'] = len(quizchoiceselecteds)
+                    relative_percentage = 0
+                context['quiz_choices_summary'].append({'id':qc.id, 'choice':qc.choice, 'times_chosen':times_chosen, 'relative_percentage':relative_percentage})
+            submissions = list(QuizChoiceSelected.objects.select_related().filter(QuizChoice__Quiz=quiz.id).order_by('id'))
+            context['quizchoiceselecteds'] = submissions
+        # id of the newest submission shown, the page asks quiz_results_live for anything after it
+        context['results_cursor'] = submissions[-1].id if submissions else 0
         return context
 
 
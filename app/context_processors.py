@@ -17,13 +17,30 @@ from app.cache_helpers import *
 from app.models import ConfidenceMeter, Quiz, Lecture, QuizChoice, QuizChoiceSelected
 
 
+def lazy_context_value(request, processor, compute):
+    # context values are handed to the template as callables, the template only calls them
+    # when it reads the variable, so pages that never show a value do no cache or db work
+    # each processor is computed at most once per request however often it is read
+    def value():
+        values = request.__dict__.setdefault('lazy_context_values', {})
+        if processor not in values:
+            values[processor] = compute()
+        return values[processor]
+    return value
+
+def lazy_context_values(request, processor, compute, keys):
+    # same as lazy_context_value for a processor that returns several variables
+    values = lazy_context_value(request, processor, compute)
+    return dict((key, lambda key=key: values().get(key, '')) for key in keys)
+
 def django_sessions(request):
 	# context processor to add num of users on the site
-    session_count = get_session_count()
-    ret_val = {'session_count':session_count}
-    return ret_val
+    return {'session_count': lazy_context_value(request, 'django_sessions', get_session_count)}
 
 def prepare_confidence_meter_values(request):
+    return lazy_context_values(request, 'prepare_confidence_meter_values', lambda: compute_confidence_meter_values(request), CONFIDENCE_METER_KEYS + ('current',))
+
+def compute_confidence_meter_values(request):
     if not request.user.is_authenticated():
         return {}
     confidence_meter_data = get_confidence_meter_values(request)
@@ -50,47 +67,8 @@ def get_confidence_meter_values(request):
     if not request.user.is_authenticated():
         return {}
 
-    confidence_meter_data = cache.get_many(
-        [
-        'good_confidence_meter_data',
-        'neutral_confidence_meter_data',
-        'bad_confidence_meter_data',
-        'bad_left',
-        'bad_middle',
-        'bad_right'
-        ])
-
-    if confidence_meter_data == {}:
-        good_confidence_meter_data = 0
-        neutral_confidence_meter_data = 0
-        bad_confidence_meter_data = 0
-        bad_left = 0
-        bad_middle = 0
-        bad_right = 0
-        for vote in ConfidenceMeter.objects.select_related().all():
-            if vote.confidence == 1:
-                good_confidence_meter_data += 1
-            elif vote.confidence == -1:
-                bad_confidence_meter_data += 1
-                if vote.User.UserProfile.seat_location == 0:
-                    bad_left += 1
-                elif vote.User.UserProfile.seat_location == 1:
-                    bad_middle += 1
-                elif vote.User.UserProfile.seat_location == 2:
-                    bad_right += 1
-            else:
-                neutral_confidence_meter_data += 1
-
-        confidence_meter_data = {
-        'good_confidence_meter_data': good_confidence_meter_data,
-        'neutral_confidence_meter_data': neutral_confidence_meter_data,
-        'bad_confidence_meter_data': bad_confidence_meter_data,
-        'bad_left':bad_left,
-        'bad_middle':bad_middle,
-        'bad_right':bad_right
-        }
-        # store in cache
-        cache.set_many(confidence_meter_data, settings.STUDENT_POLL_INTERVAL)
+    # live counters, read cost does not depend on the number of votes
+    confidence_meter_data = get_confidence_meter()
 
     # get current vote if exists for display on web page
     confidence_meter_data.update({'current': get_user_confidence(request.user)})
@@ -98,8 +76,10 @@ def get_confidence_meter_values(request):
 
 def currents(request):
 
-    return {'current_quiz_list': filter_quiz_list(visible=True),
+    return {'current_quiz_list': lazy_context_value(request, 'currents', lambda: filter_quiz_list(visible=True)),
     'current_url': request.path,
+    # sidebar and navbar fragments are keyed on generations, so can be kept for long
+    'fragment_cache_interval': settings.FRAGMENT_CACHE_INTERVAL,
     }
 
 # get_models returns all the models, but there are 
@@ -112,6 +92,9 @@ IGNORE_MODELS = (
 )
 IGNORE_APPS = (
 	"ConfidenceMeter",
+	"ConfidenceVote",
+	"ConfidenceBucket",
+	"UserSession",
 	"QuizChoice",
 	"QuizChoiceSelected",
 	"Post",
@@ -125,12 +108,25 @@ IGNORE_APPS_FOR_STUDENTS = (
 	"Thread",
 	)
 
+# menu already built by app_list in this process, only superusers are shown one
+# models and their admin urls cannot change while the process is running
+app_list_menu = None
+
 def app_list(request):
     '''
     Get all models and add them to the context apps variable.
     '''
+    return {'apps_list': lazy_context_value(request, 'app_list', lambda: get_app_list(request))}
+
+def get_app_list(request):
+    global app_list_menu
     if not request.user.is_superuser:
-        return {}
+        return []
+    if app_list_menu == None:
+        app_list_menu = build_app_list(request)
+    return app_list_menu
+
+def build_app_list(request):
     user = request.user
     app_dict = {}
     admin_class = ModelAdmin
@@ -171,4 +167,4 @@ def app_list(request):
     app_list.sort(key=lambda x: x['name'])
     for app in app_list:
         app['models'].sort(key=lambda x: x['name'])
-    return {'apps_list': app_list}
\ No newline at end of file
+    return app_list
\ No newline at end of file
@@ -101,13 +101,21 @@ class QuizSelectionForm(forms.Form):
         super(QuizSelectionForm, self).__init__(*args, **kwargs)
         self.helper = FormHelper(self)
         self.helper.layout = Layout()
+        self.quiz = quiz
 
         queryset = filter_quizchoice_list(Quiz=quiz)
         #iterate through list  to create field for each choice
         quiz_choice_list = []
+        correct_ids = set()
         for quiz_choice in queryset:
             #place in tuples for radio buttons to display
             quiz_choice_list.append((quiz_choice.id, quiz_choice.choice))
+            if quiz_choice.correct:
+                correct_ids.add(quiz_choice.id)
+
+        # what the user has already submitted, every branch below reads it in memory
+        answer_state = get_answer_state(user, quiz)
+        selected_ids = [choice_id for choice_id, answer in answer_state]
 
         # switch on quiz_type
 
@@ -117,17 +125,14 @@ class QuizSelectionForm(forms.Form):
 
         if quiz.quiz_type == QuizType.FREEFORM:
 
-            quiz_answer = QuizChoiceSelected.objects.filter(User=user, Quiz=quiz)
-
-            if quiz_answer.exists():
+            if len(answer_state) != 0:
                 # Quiz answered, prepare form to display result
-                # filter returns a list, get first, also assume list length is 1
-                quiz_answer=quiz_answer[0]
+                # assume there is only one answer
                 label = "Compare your answer to the correct answer"
                 if quiz.answer == '':
                     label = "Your answer has been submitted"
 
-                self.fields['answer'] = forms.CharField(label=label, initial=quiz_answer.answer, widget=forms.Textarea(attrs={_('class'): _('form-control')}))
+                self.fields['answer'] = forms.CharField(label=label, initial=answer_state[0][1], widget=forms.Textarea(attrs={_('class'): _('form-control')}))
                 if not quiz.answer == '':
                     self.fields['correct_answer'] = forms.CharField(initial=quiz.answer, widget=forms.Textarea(attrs={_('class'): _('form-control')}))
 
@@ -157,7 +162,7 @@ class QuizSelectionForm(forms.Form):
                         )
                     )
 
-            elif not quiz_answer.exists() and not quiz.visible:
+            elif not quiz.visible:
                 # Quiz not answered yet, but finished, disable fields
 
                 self.fields['answer'] = forms.CharField(label="You did not answer the quiz in time",  widget=forms.Textarea(attrs={_('class'): _('form-control')}))
@@ -218,9 +223,8 @@ class QuizSelectionForm(forms.Form):
 
         if quiz.quiz_type == QuizType.SINGLEMCQ:
 
-            # if quiz not answered yet, filter will return an empty list
-            quiz_choice_selected = QuizChoiceSelected.objects.select_related().filter(User=user, QuizChoice__Quiz=quiz.id)
-            if len(quiz_choice_selected) == 0 and quiz.visible:
+            # if quiz not answered yet, selected_ids will be an empty list
+            if len(selected_ids) == 0 and quiz.visible:
                 # Quiz not answered yet, prepare form to collect
                 self.fields['choices'] = forms.ChoiceField(
                     choices = quiz_choice_list,
@@ -239,7 +243,7 @@ class QuizSelectionForm(forms.Form):
                 # form is to have a submit button since it needs to collect data
                 self.helper.add_input(Submit(_('submit'), _('Submit')))
 
-            elif len(quiz_choice_selected) == 0 and not quiz.visible:
+            elif len(selected_ids) == 0 and not quiz.visible:
                 # Quiz not answered yet, but finished, disable fields
                 self.fields['choices'] = forms.ChoiceField(
                     label="You did not answer the quiz in time",
@@ -254,10 +258,10 @@ class QuizSelectionForm(forms.Form):
                         )
                     )
 
-            elif len(quiz_choice_selected) != 0:
+            elif len(selected_ids) != 0:
                 # Quiz answered, prepare form to display result
                 # SINGLEMCQ only allows one choice to be selected
-                initial_value = quiz_choice_selected.first().QuizChoice.id
+                initial_value = selected_ids[0]
                 self.fields['choices'] = forms.ChoiceField(
                     choices = quiz_choice_list,
                     required=True,
@@ -271,7 +275,7 @@ class QuizSelectionForm(forms.Form):
                         )
                     )
                 # depending on the chosen choice, display the result in place of the submit button
-                if quiz_choice_selected.first().QuizChoice.correct:
+                if selected_ids[0] in correct_ids:
                     self.helper.add_input(Button(name = "", value="CORRECT", css_class="btn-success"))
                 else:
                     self.helper.add_input(Button(name = "", value="WRONG", css_class="btn-danger"))
@@ -282,9 +286,8 @@ class QuizSelectionForm(forms.Form):
 
         if quiz.quiz_type == QuizType.MULTIMCQ:
 
-            # if quiz not answered yet, filter will return an empty list
-            quiz_choice_selected = QuizChoiceSelected.objects.select_related().filter(User=user, QuizChoice__Quiz=quiz.id)
-            if len(quiz_choice_selected) == 0:
+            # if quiz not answered yet, selected_ids will be an empty list
+            if len(selected_ids) == 0:
                 # Quiz not answered yet, prepare form to collect
                 self.fields['choices'] = forms.MultipleChoiceField(
                     choices = quiz_choice_list,
@@ -303,7 +306,7 @@ class QuizSelectionForm(forms.Form):
                     )
                 # form is to have a submit button since it needs to collect data
                 self.helper.add_input(Submit(_('submit'), _('Submit')))
-            elif len(quiz_choice_selected) == 0 and not quiz.visible:
+            elif len(selected_ids) == 0 and not quiz.visible:
 
                 self.fields['choices'] = forms.MultipleChoiceField(
                     choices = quiz_choice_list,
@@ -317,10 +320,10 @@ class QuizSelectionForm(forms.Form):
                         )
                     )
 
-            elif len(quiz_choice_selected) != 0:
+            elif len(selected_ids) != 0:
                 # Quiz answered, prepare form to display result
                 # MULTIMCQ will have many choices selected
-                initial_value = [qcs.QuizChoice.id for qcs in quiz_choice_selected]
+                initial_value = selected_ids
                 self.fields['choices'] = forms.MultipleChoiceField(
                     choices = quiz_choice_list,
                     required=True,
@@ -334,13 +337,12 @@ class QuizSelectionForm(forms.Form):
                         )
                     )
                 # depending on the chosen choice, display the result in place of the submit button
-                list_of_corrects = filter_quizchoice_list_for_correct(Quiz=quiz, correct=True)
-                overlapping_choices = set([qcs.QuizChoice for qcs in quiz_choice_selected]) & set(list_of_corrects)
+                overlapping_choices = set(selected_ids) & correct_ids
 
                 if len(overlapping_choices) == 0:
                     # completely wrong
                     self.helper.add_input(Button(name = _(""), value="WRONG", css_class='btn-danger'))
-                elif len(overlapping_choices) == len(list_of_corrects):
+                elif len(overlapping_choices) == len(correct_ids):
                     # all correct
                     self.helper.add_input(Button(name = _(""), value="CORRECT", css_class='btn-success'))
                 else:
@@ -352,9 +354,8 @@ class QuizSelectionForm(forms.Form):
         # response can be correct, partially correct or wrong
 
         if quiz.quiz_type == QuizType.ZEROMCQ:
-            # if quiz not answered yet, filter will return an empty list
-            quiz_choice_selected = QuizChoiceSelected.objects.select_related().filter(User=user, QuizChoice__Quiz=quiz.id)
-            if len(quiz_choice_selected) == 0 and quiz.visible:
+            # if quiz not answered yet, selected_ids will be an empty list
+            if len(selected_ids) == 0 and quiz.visible:
                 self.fields['choices'] = forms.ChoiceField(
                     choices = quiz_choice_list,
                     required=True,
@@ -371,7 +372,7 @@ class QuizSelectionForm(forms.Form):
                     )
                 # form is to have a submit button since it needs to collect data
                 self.helper.add_input(Submit(_('submit'), _('Submit')))
-            elif len(quiz_choice_selected) == 0 and not quiz.visible:
+            elif len(selected_ids) == 0 and not quiz.visible:
                 # Quiz not answered yet, but finished, disable fields
 
                 self.fields['choices'] = forms.ChoiceField(
@@ -386,9 +387,9 @@ class QuizSelectionForm(forms.Form):
                         Field('choices', disabled=_('true'))
                         )
                     )
-            elif len(quiz_choice_selected) != 0:
+            elif len(selected_ids) != 0:
                 # Quiz answered, prepare form to display result
-                initial_value = quiz_choice_selected.first().QuizChoice.id
+                initial_value = selected_ids[0]
                 self.fields['choices'] = forms.ChoiceField(
                     choices = quiz_choice_list,
                     required=True,
@@ -417,17 +418,15 @@ class QuizSelectionForm(forms.Form):
         return get_quiz_object(id=quiz)
 
     def save(self, *args, **kwargs):
+        # submissions are queued and saved in batches, returns False if the quiz was already answered
         data = self.cleaned_data
 
         if not data.get('answer') == None:
-            return QuizChoiceSelected.objects.create(User=data.get('user'), Quiz=data.get('quiz'), answer=data.get('answer'))
+            return queue_quiz_answer(data.get('user'), data.get('quiz'), answer=data.get('answer'))
         else:
-            # change a single choice into an array of single choice so that it will work in the query
+            # change a single choice into an array of single choice so that it can be queued the same way
             selected_choices = data.get('choices') if type(data.get('choices'))==type([]) else [data.get('choices')]
-            # need user and choices to create object
-            user_object = get_user_object(id=data.get('user').id)
-            return [QuizChoiceSelected.objects.create(User=user_object, QuizChoice=selection)
-            for selection in QuizChoice.objects.filter(id__in=selected_choices)]
+            return queue_quiz_answer(data.get('user'), self.quiz, choice_ids=[int(choice) for choice in selected_choices])
 
 class CreateThreadForm(forms.ModelForm):
 
@@ -538,28 +537,27 @@ class QuickSettingsForm(forms.Form):
         self.helper = FormHelper(self)
         self.helper.form_id = 'quick_settings_form'
         self.helper.layout = Layout()
+        lecture_list = get_lecture_list()
         # assign current lecture from session
         if session!=None and session.has_key('quick_lecture'):
             quick_lecture = session.get('quick_lecture')
-        elif get_lecture_list().exists():
+        elif lecture_list:
             # must be existing lecture to choose from
-            quick_lecture = get_last_lecture_object().id
+            quick_lecture = lecture_list[-1].id
         else:
             quick_lecture = ""
-        visible_quizzes = []
-        invisible_quizzes = []
 
-        for obj in Quiz.objects.all():
-            if obj.visible == True:
-                visible_quizzes.append((obj.id, obj.question))
-            elif obj.visible == False and obj.Lecture.id == int(quick_lecture):
+        # both lists are read through the cached quiz indexes, no query once they are filled
+        visible_quizzes = [(quiz.id, quiz.question) for quiz in filter_quiz_list(visible=True)]
+        invisible_quizzes = []
+        for lecture in lecture_list:
+            if str(lecture.id) == str(quick_lecture):
+                invisible_quizzes = [(quiz.id, quiz.question) for quiz in filter_quiz_list(visible=False, Lecture=lecture)]
 
-                invisible_quizzes.append((obj.id, obj.question))
-        
         self.fields['Lecture'] = forms.ChoiceField(
             label = _("Current Lecture"),
             initial = quick_lecture,
-            choices = [(i.id,i.title) for i in get_lecture_list()],
+            choices = [(i.id,i.title) for i in lecture_list],
             widget = forms.Select(attrs={_('id'):('quick_lecture_select'), _('class'): _('form-control')}),
             )
         if visible_quizzes:
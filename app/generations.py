@@ -0,0 +1,33 @@
+"""
+Cache generation counters
+derived cache keys carry the generation of every namespace they depend on, so a
+write bumps one counter and every derived key turns over at once
+keys from older generations are never read again and simply expire
+namespaces are a model name, or 'lecture_<id>' / 'thread_<id>' / 'quiz_<id>' for one object
+'quiz_visibility' only moves when a quiz is opened or closed
+"""
+
+import time
+
+from django.core.cache import cache
+
+def get_generations(*namespaces):
+	keys = ['generation_%s' % namespace for namespace in namespaces]
+	generations = cache.get_many(keys)
+	for key in keys:
+		if key not in generations:
+			# start from the clock so a counter that was evicted never reuses an old generation
+			cache.add(key, int(time.time() * 1000), None)
+			generations[key] = cache.get(key, 0)
+	return [generations[key] for key in keys]
+
+def generation_key(key, *namespaces):
+	return '%s_%s' % (key, '_'.join(str(generation) for generation in get_generations(*namespaces)))
+
+def bump_generation(*namespaces):
+	for namespace in namespaces:
+		try:
+			cache.incr('generation_%s' % namespace)
+		except ValueError:
+			# counter not started yet or evicted
+			cache.set('generation_%s' % namespace, int(time.time() * 1000), None)
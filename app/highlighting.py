@@ -0,0 +1,77 @@
+"""
+Pygments render cache
+highlighted html is keyed on a hash of everything that affects it, so a snippet
+is only highlighted once per version of its code
+recent renders are kept in a small in process lru with the django cache behind it
+the colours live in one stylesheet per style, served from a fingerprinted url so
+browsers cache it for good and snippet html carries only the shared class names
+cache sizes and timeouts specified in settings.py
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.utils.translation import ugettext_lazy as _
+
+from pygments import highlight
+from pygments.formatters.html import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+
+# lexers and formatters hold no state between highlight calls, so one of each is shared
+lexers = {}
+formatters = {}
+stylesheets = {}
+
+# most recently used renders in this process, oldest first
+recent_renders = OrderedDict()
+recent_renders_lock = threading.Lock()
+
+def get_lexer(syntax):
+	if syntax not in lexers:
+		lexers[syntax] = get_lexer_by_name(syntax)
+	return lexers[syntax]
+
+def get_formatter(style):
+	if style not in formatters:
+		formatters[style] = HtmlFormatter(style=style, nowrap=True)
+	return formatters[style]
+
+def get_stylesheet(style='default'):
+	# returns the css for every snippet highlighted in a style, with its fingerprint
+	if style not in stylesheets:
+		css = get_formatter(style).get_style_defs('.code')
+		stylesheets[style] = (css, hashlib.sha1(css.encode('utf-8')).hexdigest()[:12])
+	return stylesheets[style]
+
+def get_stylesheet_url(style='default'):
+	css, fingerprint = get_stylesheet(style)
+	return reverse('code_stylesheet', kwargs={'style':style, 'fingerprint':fingerprint})
+
+def get_render_key(code, syntax, style):
+	digest = hashlib.sha1(u'\0'.join([code, syntax, style]).encode('utf-8')).hexdigest()
+	return 'code_render_%s' % digest
+
+def render_code(code, syntax, style='default'):
+	# the page showing the html links get_stylesheet_url(style) for the colours
+	key = get_render_key(code, syntax, style)
+	with recent_renders_lock:
+		html = recent_renders.pop(key, None)
+		if html != None:
+			# move to the most recently used end
+			recent_renders[key] = html
+			return html
+	html = cache.get(key)
+	if html == None:
+		code_html = highlight(code, get_lexer(syntax), get_formatter(style))
+		# Included in a DIV, so the next item will be displayed below.
+		html = _('<div class="code"><pre>%(html)s</pre></div>\n') % {'html':code_html}
+		cache.set(key, html, settings.CODE_RENDER_CACHE_TIMEOUT)
+	with recent_renders_lock:
+		recent_renders[key] = html
+		while len(recent_renders) > settings.CODE_RENDER_CACHE_SIZE:
+			recent_renders.popitem(last=False)
+	return html
@@ -0,0 +1,82 @@
+"""
+Live update channel
+events are appended to a short log kept in cache and long poll requests wait
+on the log, so clients are only sent data when something actually changes
+event log sizes and long poll timings specified in settings.py
+"""
+
+import time
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+# long polls hold a worker thread while they wait, cap how many can wait at
+# once in this process so there are always threads left for normal pages
+live_poll_slots = threading.BoundedSemaphore(settings.LIVE_POLL_MAX_WAITERS)
+
+def get_live_event_cursor():
+	cursor = cache.get('live_event_cursor')
+	if cursor == None:
+		cache.add('live_event_cursor', 0, None)
+		cursor = cache.get('live_event_cursor', 0)
+	return cursor
+
+# kinds published at most once per interval in seconds, since every event wakes every waiting long poll
+# an event inside the interval is held back and published once the interval is over, see publish_held_live_events
+COALESCED_LIVE_EVENTS = {
+	'confidence': settings.CONFIDENCE_FLUSH_INTERVAL,
+}
+
+def publish_live_event(kind, data=None):
+	# kind is one of 'confidence', 'confidence_message', 'quiz', 'quiz_answer', 'session_count'
+	# returns the cursor of the event, or None when it was held back
+	if kind in COALESCED_LIVE_EVENTS and not cache.add('live_event_due_%s' % kind, True, COALESCED_LIVE_EVENTS[kind]):
+		# the latest held event replaces any earlier one
+		cache.set('live_event_held_%s' % kind, (data,), settings.LIVE_EVENT_TIMEOUT)
+		return None
+	return append_live_event(kind, data)
+
+def publish_held_live_events():
+	# publishes the events held back by publish_live_event whose interval is over
+	keys = dict(('live_event_held_%s' % kind, kind) for kind in COALESCED_LIVE_EVENTS)
+	for key, held in cache.get_many(keys.keys()).iteritems():
+		if cache.add('live_event_due_%s' % keys[key], True, COALESCED_LIVE_EVENTS[keys[key]]):
+			cache.delete(key)
+			append_live_event(keys[key], held[0])
+
+def append_live_event(kind, data=None):
+	cache.add('live_event_cursor', 0, None)
+	try:
+		cursor = cache.incr('live_event_cursor')
+	except ValueError:
+		# cursor evicted between the add and incr, start the log again
+		cache.set('live_event_cursor', 1, None)
+		cursor = 1
+	cache.set('live_event_%s' % cursor, (kind, data), settings.LIVE_EVENT_TIMEOUT)
+	return cursor
+
+def get_live_events(cursor):
+	# returns the current cursor and the events after the given cursor
+	# events is None when they can no longer be replayed and the client has to resync
+	# called over and over by waiting long polls, so held back events go out once they are due
+	publish_held_live_events()
+	current = get_live_event_cursor()
+	if cursor == current:
+		return current, []
+	if cursor > current or current - cursor > settings.LIVE_EVENT_BUFFER_SIZE:
+		return current, None
+	keys = ['live_event_%s' % i for i in xrange(cursor+1, current+1)]
+	events = cache.get_many(keys)
+	if len(events) != len(keys):
+		# some events have expired
+		return current, None
+	return current, [events[key] for key in keys]
+
+def wait_for_live_events(cursor, timeout):
+	deadline = time.time() + timeout
+	while True:
+		current, events = get_live_events(cursor)
+		if events != [] or time.time() >= deadline:
+			return current, events
+		time.sleep(settings.LIVE_POLL_SLEEP_INTERVAL)
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from app.models import ConfidenceBucket
+
+class Command(BaseCommand):
+	# rolls old ConfidenceVote rows up into per minute ConfidenceBucket rows
+	# call this function with python manage.py compactconfidence
+	def handle(self, *args, **options):
+		count = ConfidenceBucket.compact()
+		self.stdout.write("compacted %s votes" % count)
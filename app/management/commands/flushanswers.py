@@ -0,0 +1,8 @@
+from django.core.management.base import BaseCommand
+from app.cache_helpers import flush_quiz_answers
+
+class Command(BaseCommand):
+	# writes quiz answers waiting in cache to the QuizChoiceSelected table
+	# call this function with python manage.py flushanswers
+	def handle(self, *args, **options):
+		flush_quiz_answers()
@@ -0,0 +1,8 @@
+from django.core.management.base import BaseCommand
+from app.cache_helpers import flush_confidence_votes
+
+class Command(BaseCommand):
+	# writes confidence votes waiting in cache to the ConfidenceMeter table
+	# call this function with python manage.py flushconfidence
+	def handle(self, *args, **options):
+		flush_confidence_votes()
@@ -0,0 +1,8 @@
+from django.core.management.base import BaseCommand
+from app.cache_helpers import flush_thread_views
+
+class Command(BaseCommand):
+	# adds thread views counted in cache to the Thread table
+	# call this function with python manage.py flushviews
+	def handle(self, *args, **options):
+		flush_thread_views()
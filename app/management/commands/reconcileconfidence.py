@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from app.cache_helpers import rebuild_confidence_meter
+
+class Command(BaseCommand):
+	# rebuilds the live confidence meter counters from the ConfidenceMeter table, correcting any drift
+	# run it from cron every minute or so with python manage.py reconcileconfidence
+	def handle(self, *args, **options):
+		if rebuild_confidence_meter() == None:
+			self.stderr.write("votes are still queued, the counters were left as they are")
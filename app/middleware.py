@@ -3,6 +3,8 @@ from django.conf import settings
 from django.db import connection
 from django.utils import termcolors
 
+from app.presence import record_presence
+
 # function used during debug to determine number of db queries
 # use debug toolbar instead
 
@@ -32,4 +34,25 @@ class QueryPrintingMiddleware(object):
             # runserver just prints its output to sys.stderr, so follow suite
             sys.stderr.write(output)
 
-        return response
\ No newline at end of file
+        return response
+
+class PresenceMiddleware(object):
+    # records a heartbeat for every authenticated request, see app/presence.py
+    # must come after AuthenticationMiddleware
+
+    def process_request(self, request):
+        if request.user.is_authenticated():
+            record_presence(request.user.id)
+
+
+class ContextProcessorReportMiddleware(object):
+    # during debug, prints which context processors each page actually read
+    # context values are lazy, see app/context_processors.py, so unread ones were never computed
+
+    def process_response(self, request, response):
+        if settings.DEBUG and 'runserver' in sys.argv:
+            used = sorted(getattr(request, 'lazy_context_values', {}).keys())
+            template = getattr(response, 'template_name', None) or request.path
+            # runserver just prints its output to sys.stderr, so follow suite
+            sys.stderr.write('# context processors for %s: %s\n' % (template, ', '.join(used) or 'none'))
+        return response
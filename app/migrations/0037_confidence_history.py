@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0036_auto_20150517_1905'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConfidenceBucket',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('minute', models.DateTimeField()),
+                ('good', models.IntegerField(default=0)),
+                ('neutral', models.IntegerField(default=0)),
+                ('bad', models.IntegerField(default=0)),
+                ('bad_left', models.IntegerField(default=0)),
+                ('bad_middle', models.IntegerField(default=0)),
+                ('bad_right', models.IntegerField(default=0)),
+                ('Lecture', models.ForeignKey(blank=True, to='app.Lecture', null=True)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='ConfidenceVote',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('confidence', models.SmallIntegerField()),
+                ('seat_location', models.SmallIntegerField(default=1)),
+                ('created_on', models.DateTimeField(db_index=True)),
+                ('Lecture', models.ForeignKey(blank=True, to='app.Lecture', null=True)),
+                ('User', models.ForeignKey(to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='confidencebucket',
+            unique_together=set([('Lecture', 'minute')]),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def set_quiz_types(apps, schema_editor):
+    # same rules as Quiz.set_quiz_type, using the historical models
+    Quiz = apps.get_model('app', 'Quiz')
+    QuizChoice = apps.get_model('app', 'QuizChoice')
+    for quiz in Quiz.objects.all():
+        correct_list = QuizChoice.objects.filter(Quiz=quiz.pk).values_list('correct', flat=True)
+        correct_count = len([correct for correct in correct_list if correct])
+        if len(correct_list) == 0:
+            quiz_type = 3
+        elif correct_count == 1:
+            quiz_type = 1
+        elif correct_count > 1:
+            quiz_type = 2
+        elif quiz.answer != u"" and quiz.answer != None:
+            quiz_type = 3
+        else:
+            quiz_type = 0
+        Quiz.objects.filter(pk=quiz.pk).update(quiz_type=quiz_type, correct_count=correct_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0038_usersession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='correct_count',
+            field=models.SmallIntegerField(default=0, editable=False),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='quiz_type',
+            field=models.SmallIntegerField(default=3, editable=False),
+            preserve_default=True,
+        ),
+        migrations.RunPython(set_quiz_types),
+    ]
@@ -16,7 +16,8 @@ class BaseSidebarContextMixin(ContextMixin):
 
 	def get_context_data(self, *args, **kwargs):
 		context = super(BaseSidebarContextMixin, self).get_context_data(*args, **kwargs)
-		context['lecture_list'] = get_lecture_list()
+		# passed uncalled, the template only calls them when the cached fragment has to be rendered
+		context['lecture_list'] = get_lecture_list
 		context['confidence_message_form'] = ConfidenceMessageForm(path=self.request.path,instance=self.request.user.UserProfile)
 		return context
 
@@ -34,6 +35,7 @@ class SidebarContextMixin(BaseSidebarContextMixin):
 
 		#used on the navbar to display tabs
 
-		context['codesnippet_list'] = filter_codesnippet_list(Lecture=context['current_lecture'])
-		context['lecture_slide_exists'] = filter_lecture_materials_list(Lecture=context['current_lecture']) != []
+		current_lecture = context['current_lecture']
+		context['codesnippet_list'] = lambda: filter_codesnippet_list(Lecture=current_lecture)
+		context['lecture_slide_exists'] = lambda: filter_lecture_materials_list(Lecture=current_lecture) != []
 		return context
\ No newline at end of file
@@ -3,27 +3,32 @@ Definition of models.
 """
 
 import string
+from datetime import timedelta
 
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.utils.text import Truncator
 from django.utils.translation import ugettext_lazy as _
 from django.conf import settings
 from django.core.cache import cache
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import Permission
+from django.contrib.auth.signals import user_logged_in
+from django.contrib.sessions.models import Session
 
 from autoslug import AutoSlugField
 
 
-from pygments import highlight, styles
-from pygments.formatters.html import HtmlFormatter
-from pygments.lexers import get_lexer_by_name
+from pygments import styles
 from pygments.styles import get_all_styles
 from pygments.styles import STYLE_MAP
 
 from app.docsURL import glist
+from app.live_updates import publish_live_event
+from app.generations import bump_generation
+from app.highlighting import render_code
 
 class SeatLocation():
     # enum for seating categorisation
@@ -58,6 +63,29 @@ class UserProfile(models.Model):
                 UserProfile.objects.create(user=user)
 
 
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=UserProfile)
+def bumpUserGeneration(sender, **kwargs):
+    # the cached user list is rebuilt from these, a login only writes last_login which it does not keep
+    if kwargs.get('update_fields') == frozenset(['last_login']):
+        return
+    bump_generation('user')
+
+
+class UserSession(models.Model):
+    # index of the sessions each user is logged in with, saves decoding every session to find them
+    # rows are deleted along with their session, on logout, flush or when expired sessions are cleared
+    User = models.ForeignKey(User)
+    Session = models.ForeignKey(Session)
+
+    def __unicode__(self):
+        return unicode(self.User)
+
+    @receiver(user_logged_in)
+    def addUserSession(sender, request, user, **kwargs):
+        UserSession.objects.get_or_create(User=user, Session_id=request.session.session_key)
+
+
 class Lecture(models.Model):
     title = models.CharField(max_length=30, unique=True)
     
@@ -98,12 +126,16 @@ class Lecture(models.Model):
 
         #check if this object is a new entry in db
         ret_val = super(Lecture, self).save(*args, **kwargs)
-        cache.delete('lecture_list')
+        # quizzes keep a copy of the lecture title and slug
+        bump_generation('lecture', 'lecture_%s' % self.id, 'quiz')
         return ret_val
 
     def delete(self, *args, **kwargs):
-        cache.delete('lecture_list')
-        return super(Lecture, self).delete(*args, **kwargs)
+        # quizzes, code snippets and materials of the lecture are deleted with it
+        namespaces = ('lecture', 'lecture_%s' % self.id, 'quiz', 'codesnippet', 'lecturematerial')
+        ret_val = super(Lecture, self).delete(*args, **kwargs)
+        bump_generation(*namespaces)
+        return ret_val
 
 
 class LectureMaterial(models.Model):
@@ -119,6 +151,16 @@ class LectureMaterial(models.Model):
         else:
             return self.online_lecture_material
 
+    def save(self, *args, **kwargs):
+        ret_val = super(LectureMaterial, self).save(*args, **kwargs)
+        bump_generation('lecturematerial', 'lecture_%s' % self.Lecture_id)
+        return ret_val
+
+    def delete(self, *args, **kwargs):
+        ret_val = super(LectureMaterial, self).delete(*args, **kwargs)
+        bump_generation('lecturematerial', 'lecture_%s' % self.Lecture_id)
+        return ret_val
+
 class QuizType():
     # represents an enum
     # no right answers
@@ -151,21 +193,33 @@ class Quiz(models.Model):
     # freeform answer, optional 
     answer = models.TextField(blank=True, null=True)
 
+    # worked out from the choices whenever the quiz or one of its choices is saved
+    quiz_type = models.SmallIntegerField(default=QuizType.FREEFORM, editable=False)
+    correct_count = models.SmallIntegerField(default=0, editable=False)
+
     def __unicode__(self):
         return unicode(self.Lecture.title + " " + self.question)
 
     def save(self, *args, **kwargs):
-
+        self.set_quiz_type()
+        # compare against the stored visibility so opening and closing a quiz is pushed to clients
+        was_visible = Quiz.objects.filter(pk=self.pk).values_list('visible', flat=True).first() if self.pk else False
         ret_val = super(Quiz, self).save(*args, **kwargs)
-        cache.delete('current_quiz_list')
+        bump_generation('quiz', 'quiz_%s' % self.id, 'lecture_%s' % self.Lecture_id)
+        if bool(was_visible) != self.visible:
+            # only opening or closing a quiz moves the version students poll on
+            bump_generation('quiz_visibility')
+            publish_live_event('quiz', {'quiz': self.id, 'visible': self.visible})
         return ret_val
 
     def delete(self, *args, **kwargs):
-
-        # remove from cache before actual delete
-
-        cache.delete('current_quiz_list')
-        return super(Quiz, self).delete(*args, **kwargs)
+        namespaces = ('quiz', 'quiz_%s' % self.id, 'lecture_%s' % self.Lecture_id)
+        if self.visible:
+            namespaces += ('quiz_visibility',)
+            publish_live_event('quiz', {'quiz': self.id, 'visible': False})
+        ret_val = super(Quiz, self).delete(*args, **kwargs)
+        bump_generation(*namespaces)
+        return ret_val
 
 
 
@@ -174,34 +228,34 @@ class Quiz(models.Model):
     def render_code(self):
  
         if self.code != None and self.code != "":
-            formatter = HtmlFormatter(style='default', nowrap=True, classprefix='code%s-' % self.pk)
-            html = highlight(self.code, get_lexer_by_name(self.syntax), formatter)
-            css = formatter.get_style_defs()
-            # Included in a DIV, so the next item will be displayed below.
-            return _('<div class="code"><style type="text/css">%(css)s</style>\n<pre>%(html)s</pre></div>\n') % {'css':css, 'html':html}
+            return render_code(self.code, self.syntax)
 
         return ""
 
-    @property
-    def quiz_type(self):
-    # must return an enum of QuizType
-        from app.cache_helpers import filter_quizchoice_list, filter_quizchoice_list_for_correct
-        quiz_choice_list = filter_quizchoice_list(Quiz=self)
-
-        if len(quiz_choice_list) == 0:
-            return QuizType.FREEFORM
-
-        num_correct = len(filter_quizchoice_list_for_correct(Quiz=self, correct=True))
-
-        if num_correct == 1:
-            return QuizType.SINGLEMCQ
-        elif num_correct > 1:
-            return QuizType.MULTIMCQ
+    def set_quiz_type(self):
+        # must set an enum of QuizType
+        correct_list = QuizChoice.objects.filter(Quiz=self.pk).values_list('correct', flat=True) if self.pk else []
+        self.correct_count = len([correct for correct in correct_list if correct])
+
+        if len(correct_list) == 0:
+            self.quiz_type = QuizType.FREEFORM
+        elif self.correct_count == 1:
+            self.quiz_type = QuizType.SINGLEMCQ
+        elif self.correct_count > 1:
+            self.quiz_type = QuizType.MULTIMCQ
         elif self.answer != u"" and self.answer != None:
-            return QuizType.FREEFORM
+            self.quiz_type = QuizType.FREEFORM
         else:
             # must be ZEROMCQ
-            return QuizType.ZEROMCQ
+            self.quiz_type = QuizType.ZEROMCQ
+
+    def update_quiz_type(self):
+        # called when a choice changes, only writes when the quiz type has moved
+        stored = (self.quiz_type, self.correct_count)
+        self.set_quiz_type()
+        if stored != (self.quiz_type, self.correct_count):
+            Quiz.objects.filter(pk=self.pk).update(quiz_type=self.quiz_type, correct_count=self.correct_count)
+            bump_generation('quiz')
 
 
 class QuizChoice(models.Model):
@@ -214,7 +268,19 @@ class QuizChoice(models.Model):
 
     @property
     def times_chosen(self):
-        return len(QuizChoiceSelected.objects.filter(QuizChoice=self.id))
+        return QuizChoiceSelected.objects.filter(QuizChoice=self.id).count()
+
+    def save(self, *args, **kwargs):
+        ret_val = super(QuizChoice, self).save(*args, **kwargs)
+        self.Quiz.update_quiz_type()
+        bump_generation('quiz_%s' % self.Quiz_id)
+        return ret_val
+
+    def delete(self, *args, **kwargs):
+        ret_val = super(QuizChoice, self).delete(*args, **kwargs)
+        self.Quiz.update_quiz_type()
+        bump_generation('quiz_%s' % self.Quiz_id)
+        return ret_val
 
 class QuizChoiceSelected(models.Model):
     User = models.ForeignKey(User)
@@ -227,6 +293,71 @@ class ConfidenceMeter(models.Model):
     User = models.OneToOneField(User)
     confidence = models.SmallIntegerField(default=0) # value of 0 means neutral
 
+class ConfidenceVote(models.Model):
+    # append only history of votes, kept when the live ConfidenceMeter table is reset
+    # compacted into ConfidenceBucket rows once they are older than CONFIDENCE_HISTORY_COMPACT_AFTER
+    User = models.ForeignKey(User)
+    Lecture = models.ForeignKey(Lecture, blank=True, null=True)
+    confidence = models.SmallIntegerField()
+    seat_location = models.SmallIntegerField(default=SeatLocation.MIDDLE)
+    created_on = models.DateTimeField(db_index=True)
+
+class ConfidenceBucket(models.Model):
+    # number of votes cast during one minute of a lecture
+    Lecture = models.ForeignKey(Lecture, blank=True, null=True)
+    minute = models.DateTimeField()
+    good = models.IntegerField(default=0)
+    neutral = models.IntegerField(default=0)
+    bad = models.IntegerField(default=0)
+    bad_left = models.IntegerField(default=0)
+    bad_middle = models.IntegerField(default=0)
+    bad_right = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('Lecture', 'minute')
+
+    def add_vote(self, confidence, seat_location):
+        if confidence == 1:
+            self.good += 1
+        elif confidence == -1:
+            self.bad += 1
+            if seat_location == SeatLocation.LEFT:
+                self.bad_left += 1
+            elif seat_location == SeatLocation.MIDDLE:
+                self.bad_middle += 1
+            elif seat_location == SeatLocation.RIGHT:
+                self.bad_right += 1
+        else:
+            self.neutral += 1
+
+    @staticmethod
+    def compact(before=None):
+        # rolls raw votes older than before up into per minute buckets and removes them
+        # returns the number of votes compacted
+        if before == None:
+            before = timezone.now() - timedelta(seconds=settings.CONFIDENCE_HISTORY_COMPACT_AFTER)
+        # only whole minutes, a minute still being voted in is left for the next run
+        before = before.replace(second=0, microsecond=0)
+        with transaction.atomic():
+            votes = ConfidenceVote.objects.filter(created_on__lt=before).order_by('id')
+            buckets = {}
+            count = 0
+            last_id = None
+            for id, lecture_id, confidence, seat_location, created_on in votes.values_list('id', 'Lecture', 'confidence', 'seat_location', 'created_on').iterator():
+                minute = created_on.replace(second=0, microsecond=0)
+                if (lecture_id, minute) not in buckets:
+                    # a bucket may already exist from an earlier run
+                    buckets[(lecture_id, minute)] = ConfidenceBucket.objects.get_or_create(Lecture_id=lecture_id, minute=minute)[0]
+                buckets[(lecture_id, minute)].add_vote(confidence, seat_location)
+                count += 1
+                last_id = id
+            for bucket in buckets.values():
+                bucket.save()
+            if count:
+                # votes arriving during the compaction have higher ids and are left alone
+                votes.filter(id__lte=last_id).delete()
+            return count
+
 class Thread(models.Model):
     # to be thread head for posts to attach onto
     title = models.TextField()
@@ -242,25 +373,21 @@ class Thread(models.Model):
     def __unicode__(self):
         return unicode(self.title)
 
-    def save(self, inc_view=None, *args, **kwargs):
-         #check if this object is a new entry in db
-
+    def save(self, *args, **kwargs):
         ret_val = super(Thread, self).save(*args, **kwargs)
-        if inc_view != True:
-            cache.delete('thread_list')
-            
+        bump_generation('thread', 'thread_%s' % self.id)
         return ret_val
 
     def delete(self, *args, **kwargs):
-
-        # remove from caches before actual delete
-
-        cache.delete('thread_list')
-        return super(Thread, self).delete(*args, **kwargs)
+        namespaces = ('thread', 'thread_%s' % self.id, 'post')
+        ret_val = super(Thread, self).delete(*args, **kwargs)
+        bump_generation(*namespaces)
+        return ret_val
 
     def inc_views(self):
-        self.views = self.views + 1
-        self.save(inc_view=True)
+        # counted in cache and written in batches, see flush_thread_views
+        from app.cache_helpers import record_thread_view
+        record_thread_view(self.id)
 
     def Creator_name(self):
         return _("anonymous") if self.anonymous else self.Creator.username
@@ -281,10 +408,18 @@ class Post(models.Model):
         return _("anonymous") if self.anonymous else self.Creator.username
 
     def save(self, *args, **kwargs):
+        # only the reply columns are written so the thread's views, added by flush_thread_views, are kept
         self.Thread.replies = self.Thread.replies + 1
-        self.Thread.save()
-        cache.delete('post_list')
-        return super(Post, self).save(*args, **kwargs)
+        self.Thread.last_post = timezone.now()
+        Thread.objects.filter(id=self.Thread_id).update(replies=models.F('replies') + 1, last_post=self.Thread.last_post)
+        ret_val = super(Post, self).save(*args, **kwargs)
+        bump_generation('post', 'thread', 'thread_%s' % self.Thread_id)
+        return ret_val
+
+    def delete(self, *args, **kwargs):
+        ret_val = super(Post, self).delete(*args, **kwargs)
+        bump_generation('post', 'thread', 'thread_%s' % self.Thread_id)
+        return ret_val
 
 
 class CodeSnippet(models.Model):
@@ -301,11 +436,14 @@ class CodeSnippet(models.Model):
 
     @property
     def render_code(self):
-        formatter = HtmlFormatter(style='default', nowrap=True, classprefix='code%s-' % self.pk)
-        html = highlight(self.code, get_lexer_by_name(self.syntax), formatter)
-        css = formatter.get_style_defs()
-
-        # Included in a DIV, so the next item will be displayed below.
-        return _('<div class="code"><style type="text/css">%(css)s</style>\n<pre>%(html)s</pre></div>\n') % {'css':css, 'html':html}
+        return render_code(self.code, self.syntax)
 
+    def save(self, *args, **kwargs):
+        ret_val = super(CodeSnippet, self).save(*args, **kwargs)
+        bump_generation('codesnippet', 'lecture_%s' % self.Lecture_id)
+        return ret_val
 
+    def delete(self, *args, **kwargs):
+        ret_val = super(CodeSnippet, self).delete(*args, **kwargs)
+        bump_generation('codesnippet', 'lecture_%s' % self.Lecture_id)
+        return ret_val
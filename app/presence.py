@@ -0,0 +1,56 @@
+"""
+Presence tracker
+authenticated requests record a heartbeat into time buckets kept in cache, every
+user is counted in the bucket they were last seen in, so the online count is the
+sum of the bucket counters inside the window
+bucket size and window specified in settings.py
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+def get_presence_bucket(now=None):
+	return int(now if now != None else time.time()) // settings.PRESENCE_BUCKET_SIZE
+
+def get_presence_window():
+	current = get_presence_bucket()
+	return range(current - settings.PRESENCE_BUCKETS + 1, current + 1)
+
+def record_presence(user_id):
+	bucket = get_presence_bucket()
+	timeout = settings.PRESENCE_BUCKET_SIZE * (settings.PRESENCE_BUCKETS + 1)
+	# only the first request from a user in each bucket gets past this add
+	if not cache.add('presence_%s_%s' % (bucket, user_id), True, timeout):
+		return
+	last_bucket = cache.get('presence_user_%s' % user_id)
+	cache.set('presence_user_%s' % user_id, bucket, timeout)
+	cache.add('presence_count_%s' % bucket, 0, timeout)
+	try:
+		cache.incr('presence_count_%s' % bucket)
+	except ValueError:
+		cache.set('presence_count_%s' % bucket, 1, timeout)
+	if last_bucket != None and last_bucket != bucket:
+		# move the user out of the bucket they were counted in before
+		forget_presence(last_bucket)
+
+def forget_presence(bucket):
+	try:
+		cache.decr('presence_count_%s' % bucket)
+	except ValueError:
+		# bucket has already expired
+		pass
+
+def remove_presence(user_id):
+	# called on logout so the user stops counting straight away
+	last_bucket = cache.get('presence_user_%s' % user_id)
+	if last_bucket == None:
+		return
+	cache.delete_many(['presence_user_%s' % user_id, 'presence_%s_%s' % (last_bucket, user_id)])
+	forget_presence(last_bucket)
+
+def get_online_count():
+	# number of users seen inside the window, one get_many whatever the number of users
+	counts = cache.get_many(['presence_count_%s' % bucket for bucket in get_presence_window()])
+	return sum(max(count, 0) for count in counts.values())
@@ -0,0 +1,152 @@
+"""
+Compact records for cached lists
+lists are cached as tuples of field values rather than pickled model instances,
+so cache values stay small and decoding them on every request is cheap
+bump a record's version whenever its fields change so stale cache values are refilled
+"""
+
+from collections import OrderedDict
+from itertools import izip
+
+from django.contrib.auth.models import User
+from django.db.models.query_utils import deferred_class_factory
+from django.utils.translation import ugettext_lazy as _
+
+from app.models import Lecture, Quiz, Thread, Post
+
+
+def build_instance(model, values):
+	# fields missing from values are deferred, they are loaded on access and left alone by save
+	deferred = [field.attname for field in model._meta.concrete_fields if field.attname not in values]
+	if deferred:
+		model = deferred_class_factory(model, deferred)
+	obj = model(**values)
+	obj._state.adding = False
+	obj._state.db = 'default'
+	return obj
+
+
+class Record(object):
+	# fields are model attnames, in the order they are stored
+	# related are (name, lookup) pairs for values followed across foreign keys
+	__slots__ = ()
+	model = None
+	version = 1
+	fields = ()
+	related = ()
+
+	def __init__(self, *values):
+		for name, value in izip(self.__slots__, values):
+			setattr(self, name, value)
+
+	@classmethod
+	def columns(cls):
+		return cls.fields + tuple(lookup for name, lookup in cls.related)
+
+	def get_object(self):
+		# model instance rebuilt from the cached fields, no query needed
+		# related values are set up as the related objects, so following them needs no query either
+		obj = build_instance(self.model, dict((name, getattr(self, name)) for name in self.fields))
+		relations = OrderedDict()
+		for name, lookup in self.related:
+			relation, attname = lookup.split('__', 1)
+			relations.setdefault(relation, {})[attname] = getattr(self, name)
+		for relation, values in relations.iteritems():
+			field, model, direct, m2m = self.model._meta.get_field_by_name(relation)
+			if direct:
+				# foreign key, the related row is the one the key points at
+				related_model = field.rel.to
+				values[field.rel.get_related_field().attname] = getattr(obj, field.attname)
+			else:
+				# reverse one to one, the related row points back at this one
+				related_model = field.model
+				values[field.field.attname] = obj.pk
+			if values[related_model._meta.pk.attname] == None:
+				# no related row, which the descriptors take as None or DoesNotExist
+				setattr(obj, field.get_cache_name(), None)
+			else:
+				setattr(obj, field.get_cache_name(), build_instance(related_model, values))
+		return obj
+
+	def __unicode__(self):
+		return unicode(self.get_object())
+
+	def __repr__(self):
+		return '<%s: %s>' % (self.__class__.__name__, self.id)
+
+
+class UserRecord(Record):
+	# only what pages show and forms link to, the password hash and login times are deferred
+	model = User
+	version = 2
+	fields = ('id', 'is_superuser', 'username', 'first_name', 'last_name', 'email', 'is_staff', 'is_active')
+	related = (('UserProfile_id', 'UserProfile__id'), ('UserProfile_seat_location', 'UserProfile__seat_location'))
+	__slots__ = fields + ('UserProfile_id', 'UserProfile_seat_location')
+
+
+class LectureRecord(Record):
+	model = Lecture
+	fields = ('id', 'title', 'collab_doc', 'slug')
+	__slots__ = fields
+
+	@property
+	def get_absolute_url(self):
+		return _("%(id)s/%(slug)s") % {'id':self.id, 'slug':self.slug}
+
+	def __unicode__(self):
+		return unicode(self.title)
+
+
+class QuizRecord(Record):
+	model = Quiz
+	version = 2
+	fields = ('id', 'question', 'visible', 'Lecture_id', 'last_touch', 'slug', 'syntax', 'code', 'answer', 'quiz_type', 'correct_count')
+	related = (('Lecture_title', 'Lecture__title'), ('Lecture_slug', 'Lecture__slug'))
+	__slots__ = fields + ('Lecture_title', 'Lecture_slug')
+
+	@property
+	def Lecture(self):
+		# only the lecture fields needed to link to the quiz, collab_doc is not kept
+		return LectureRecord(self.Lecture_id, self.Lecture_title, None, self.Lecture_slug)
+
+	def __unicode__(self):
+		return unicode(self.Lecture_title + " " + self.question)
+
+
+class ThreadRecord(Record):
+	model = Thread
+	fields = ('id', 'title', 'content', 'Creator_id', 'created_on', 'views', 'slug', 'last_post', 'anonymous', 'replies')
+	related = (('Creator_username', 'Creator__username'),)
+	__slots__ = fields + ('Creator_username',)
+
+	@property
+	def Creator_name(self):
+		return _("anonymous") if self.anonymous else self.Creator_username
+
+	def __unicode__(self):
+		return unicode(self.title)
+
+
+class PostRecord(Record):
+	model = Post
+	fields = ('id', 'Thread_id', 'content', 'Creator_id', 'last_touch', 'rank', 'anonymous')
+	related = (('Creator_username', 'Creator__username'),)
+	__slots__ = fields + ('Creator_username',)
+
+	@property
+	def Creator_name(self):
+		return _("anonymous") if self.anonymous else self.Creator_username
+
+	def __unicode__(self):
+		return unicode(self.content)
+
+
+def dump_records(record_class, queryset):
+	# stamped with the record version so a change of fields is never decoded into the wrong attributes
+	return (record_class.version, list(queryset.values_list(*record_class.columns())))
+
+def load_records(record_class, data):
+	# returns None when the data was written for another version of the record
+	if not isinstance(data, tuple) or len(data) != 2 or data[0] != record_class.version:
+		return None
+	return [record_class(*row) for row in data[1]]
@@ -58,29 +58,84 @@ function update_confidence_messages(data) {
     $("#confidence-messages").html(html)
 }
 
-var ping_interval = 1000
-setInterval(function() {
+function admin_live_update(data) {
+    if (typeof data.confidence !== 'undefined') {
+        plot_confidence({
+            'good_confidence_meter_data':data.confidence['good_confidence_meter_data'],
+            'neutral_confidence_meter_data':data.confidence['neutral_confidence_meter_data'],
+            'bad_confidence_meter_data':data.confidence['bad_confidence_meter_data'],
+            'bad_left':data.confidence['bad_left'],
+            'bad_middle':data.confidence['bad_middle'],
+            'bad_right':data.confidence['bad_right']
+        });
+    }
+    if (typeof data.confidence_messages !== 'undefined') {
+        update_confidence_messages(data.confidence_messages);
+    }
+    if (typeof data.session_count !== 'undefined') {
+        refresh_session_count(data.session_count)
+    }
+}
+$(document).ready(function() { live_poll(null, admin_live_update) });
+
+/* confidence trend graph, samples are kept here and only newer ones are requested */
+var trend_resolution = 1
+var trend_samples = []
+var trend_cursor = 0
+
+function set_trend_resolution(resolution) {
+    trend_resolution = resolution
+    trend_samples = []
+    trend_cursor = 0
+    poll_confidence_trend()
+}
+
+function plot_confidence_trend() {
+    var good = [], neutral = [], bad = []
+    for (var i = 0; i < trend_samples.length; i++) {
+        var time = trend_samples[i][0]*1000
+        good.push([time, trend_samples[i][1]])
+        neutral.push([time, trend_samples[i][2]])
+        bad.push([time, trend_samples[i][3]])
+    }
+    $.plot('#confidence-trend-graph', [
+        {label: 'good', data: good, color: "#5cb85c"},
+        {label: 'neutral', data: neutral, color: "#f0ad4e"},
+        {label: 'bad', data: bad, color: "#d9534f"}
+    ], {
+        xaxis: {mode: "time", timezone: "browser"},
+        yaxis: {min: 0}
+    });
+}
+
+function poll_confidence_trend() {
     $.ajax({
         type: "GET",
-        url:  "/admin_poll/",
+        url:  "/admin_poll/confidence_trend/",
         dataType: 'json',
+        data: {'resolution': trend_resolution, 'since': trend_cursor},
         success: function (data) {
-        	plot_confidence({
-                'good_confidence_meter_data':data['good_confidence_meter_data'], 
-                'neutral_confidence_meter_data':data['neutral_confidence_meter_data'], 
-                'bad_confidence_meter_data':data['bad_confidence_meter_data'],
-                'bad_left':data['bad_left'],
-                'bad_middle':data['bad_middle'],
-                'bad_right':data['bad_right']
-            });
-            update_confidence_messages(data['confidence_messages']);
+            /* ignore responses for a resolution that is no longer shown */
+            if (data.resolution != trend_resolution) {
+                return
+            }
+            trend_samples = trend_samples.concat(data.samples).slice(-data.slots)
+            trend_cursor = data.cursor
+            plot_confidence_trend()
         },
         error: function(response){
         },
-	});
-    $("#footer-div").load(" #footer-div", function() {$(this).children().unwrap()});
-    }, ping_interval
-)
+    });
+}
+$(document).ready(function() {
+    poll_confidence_trend()
+    setInterval(function() {
+        /* poll at the resolution of the graph */
+        if (Math.floor(Date.now()/1000) % trend_resolution == 0) {
+            poll_confidence_trend()
+        }
+    }, 1000)
+});
 
 function quick_update(data_id, value, csrf_token) {
 	data = {
@@ -1 +1,46 @@
-function plot_confidence(e){flot_data=[],Object.keys(e).forEach(function(t){var a=e[t];color="","good_confidence_meter_data"==t&&(color="#5cb85c",flot_data.push({label:"good",data:a,color:color}),$("#good_confidence_meter_data").html("Good: "+e[t])),"neutral_confidence_meter_data"==t&&(color="#f0ad4e",flot_data.push({label:"neutral",data:a,color:color}),$("#neutral_confidence_meter_data").html("Neutral: "+e[t])),"bad_confidence_meter_data"==t&&(color="#d9534f",flot_data.push({label:"bad",data:a,color:color}),$("#bad_confidence_meter_data").html("Bad: "+e[t])),"bad_left"==t&&$("#bad-seat-location-left").html(e[t]),"bad_middle"==t&&$("#bad-seat-location-middle").html(e[t]),"bad_right"==t&&$("#bad-seat-location-right").html(e[t])}),$.plot("#confidence-graph",flot_data,{series:{pie:{show:!0,radius:1,label:{show:!0,radius:.75,background:{opacity:.5,color:"#000"}}}}})}function update_confidence_messages(e){html="";for(var t=0;t<e.length;t++)(null!=e[t].confidence_message||null!=e[t].user)&&(html+="<tr><td>"+e[t].user+"</td><<td>"+e[t].confidence_message+"</td></tr>");$("#confidence-messages").html(html)}function quick_update(e,t,a){data={csrfmiddlewaretoken:a,quick_settings:"Submit"},data[e]=t,$.ajax({type:"POST",url:"/quick_update/",dataType:"json",data:data,success:function(e){"lecture"==e.return_type&&$("#quick-settings-panel").load(" #quick-settings-panel",function(){$(this).children().unwrap()}),"quiz_close"==e.return_type&&$("#quick-settings-panel").load(" #quick-settings-panel",function(){$(this).children().unwrap()}),"quiz_open"==e.return_type&&$("#quick-settings-panel").load(" #quick-settings-panel",function(){$(this).children().unwrap()}),"undefined"!=typeof e.notice&&(close_button='<button type="button" class="close" data-dismiss="alert" aria-label="Close"><span aria-hidden="true">&times;</span></button>',$("#admin_alerts").html('<div class="alert alert-success alert-dismissable" role="alert">'+e.notice+close_button+"</div>"))},error:function(){}})}function minimize_panel(e,t){var a=document.getElementById(e);$(a).slideToggle();var n=document.getElementById(t);$(n).toggleClass("glyphicon glyphicon-chevron-down glyphicon glyphicon-chevron-up")}var ping_interval=1e3;setInterval(function(){$.ajax({type:"GET",url:"/admin_poll/",dataType:"json",success:function(e){plot_confidence({good_confidence_meter_data:e.good_confidence_meter_data,neutral_confidence_meter_data:e.neutral_confidence_meter_data,bad_confidence_meter_data:e.bad_confidence_meter_data,bad_left:e.bad_left,bad_middle:e.bad_middle,bad_right:e.bad_right}),update_confidence_messages(e.confidence_messages)},error:function(){}}),$("#footer-div").load(" #footer-div",function(){$(this).children().unwrap()})},ping_interval);
\ No newline at end of file
+function plot_confidence(data){flot_data=[]
+Object.keys(data).forEach(function(key){var value=data[key]
+color=''
+if(key=='good_confidence_meter_data'){color="#5cb85c"
+flot_data.push({label:'good',data:value,color:color})
+$("#good_confidence_meter_data").html('Good: '+data[key])}
+if(key=='neutral_confidence_meter_data'){color="#f0ad4e"
+flot_data.push({label:'neutral',data:value,color:color})
+$("#neutral_confidence_meter_data").html('Neutral: '+data[key])}
+if(key=='bad_confidence_meter_data'){color="#d9534f"
+flot_data.push({label:'bad',data:value,color:color})
+$("#bad_confidence_meter_data").html('Bad: '+data[key])}
+if(key=='bad_left'){$("#bad-seat-location-left").html(data[key])}
+if(key=='bad_middle'){$("#bad-seat-location-middle").html(data[key])}
+if(key=='bad_right'){$("#bad-seat-location-right").html(data[key])}});$.plot('#confidence-graph',flot_data,{series:{pie:{show:true,radius:1,label:{show:true,radius:3/4,background:{opacity:0.5,color:'#000',}},}}});}
+function update_confidence_messages(data){html="";for(var i=0;i<data.length;i++){if(data[i]['confidence_message']!=null||data[i]['user']!=null){html+="<tr><td>"+data[i]['user']+"</td><<td>"+data[i]['confidence_message']+"</td></tr>";}}
+$("#confidence-messages").html(html)}
+function admin_live_update(data){if(typeof data.confidence!=='undefined'){plot_confidence({'good_confidence_meter_data':data.confidence['good_confidence_meter_data'],'neutral_confidence_meter_data':data.confidence['neutral_confidence_meter_data'],'bad_confidence_meter_data':data.confidence['bad_confidence_meter_data'],'bad_left':data.confidence['bad_left'],'bad_middle':data.confidence['bad_middle'],'bad_right':data.confidence['bad_right']});}
+if(typeof data.confidence_messages!=='undefined'){update_confidence_messages(data.confidence_messages);}
+if(typeof data.session_count!=='undefined'){refresh_session_count(data.session_count)}}
+$(document).ready(function(){live_poll(null,admin_live_update)});var trend_resolution=1
+var trend_samples=[]
+var trend_cursor=0
+function set_trend_resolution(resolution){trend_resolution=resolution
+trend_samples=[]
+trend_cursor=0
+poll_confidence_trend()}
+function plot_confidence_trend(){var good=[],neutral=[],bad=[]
+for(var i=0;i<trend_samples.length;i++){var time=trend_samples[i][0]*1000
+good.push([time,trend_samples[i][1]])
+neutral.push([time,trend_samples[i][2]])
+bad.push([time,trend_samples[i][3]])}
+$.plot('#confidence-trend-graph',[{label:'good',data:good,color:"#5cb85c"},{label:'neutral',data:neutral,color:"#f0ad4e"},{label:'bad',data:bad,color:"#d9534f"}],{xaxis:{mode:"time",timezone:"browser"},yaxis:{min:0}});}
+function poll_confidence_trend(){$.ajax({type:"GET",url:"/admin_poll/confidence_trend/",dataType:'json',data:{'resolution':trend_resolution,'since':trend_cursor},success:function(data){if(data.resolution!=trend_resolution){return}
+trend_samples=trend_samples.concat(data.samples).slice(-data.slots)
+trend_cursor=data.cursor
+plot_confidence_trend()},error:function(response){},});}
+$(document).ready(function(){poll_confidence_trend()
+setInterval(function(){if(Math.floor(Date.now()/1000)%trend_resolution==0){poll_confidence_trend()}},1000)});function quick_update(data_id,value,csrf_token){data={'csrfmiddlewaretoken':csrf_token,'quick_settings':'Submit',}
+data[data_id]=value
+$.ajax({type:"POST",url:"/quick_update/",dataType:'json',data:data,success:function(data){if(data.return_type=='lecture'){$("#quick-settings-panel").load(" #quick-settings-panel",function(){$(this).children().unwrap()});}
+if(data.return_type=='quiz_close'){$("#quick-settings-panel").load(" #quick-settings-panel",function(){$(this).children().unwrap()});}
+if(data.return_type=='quiz_open'){$("#quick-settings-panel").load(" #quick-settings-panel",function(){$(this).children().unwrap()});}
+if(typeof data.notice!=='undefined'){close_button='<button type="button" class="close" data-dismiss="alert" aria-label="Close">'+'<span aria-hidden="true">&times;</span>'+'</button>'
+$("#admin_alerts").html('<div class="alert alert-success alert-dismissable" role="alert">'+data.notice+close_button+'</div>')}},error:function(response){},});}
+function minimize_panel(panel_body_id,panel_btn){var panel=document.getElementById(panel_body_id);$(panel).slideToggle();var btn=document.getElementById(panel_btn);$(btn).toggleClass("glyphicon glyphicon-chevron-down glyphicon glyphicon-chevron-up");}
\ No newline at end of file
@@ -35,35 +35,123 @@ function refresh_confidence(data) {
     }
 }
 
-function student_poll(current_quiz_list) {
-    /* send data in poll to compare and retrieve if needed */
-    
+var student_quiz_version = null
+
+function student_poll() {
+    /* send the last quiz version seen, the quiz list only comes back when a quiz was opened or closed */
     $.ajax({
         type: "GET",
         url:  "/student_poll/",
         dataType: 'json',
-        data: {'quiz_length': current_quiz_list},
+        data: student_quiz_version == null ? {} : {'quiz_version': student_quiz_version},
         success: function (data) {
             /* update confidence meter */
             refresh_confidence(data)
-            /* update new quiz badge number */
-            if (data.quiz_difference > 0) {
-                $('#current_quiz_list').load(' #current_quiz_list', function() {$(this).children().unwrap()})
-                $('#page-content-wrapper').load(' #page-content-wrapper', function() {$(this).children().unwrap()})
-                $.notify("quiz closed")
+            if (data.quiz_unchanged) {
+                return
             }
-            else if (data.quiz_difference < 0) {
-                $('#current_quiz_list').load(' #current_quiz_list', function() {$(this).children().unwrap()})
-                $('#page-content-wrapper').load(' #page-content-wrapper', function() {$(this).children().unwrap()})
-                $.notify("new quiz available")
+            if (student_quiz_version != null) {
+                var quiz_count = $('#current_quiz_list_inner li').length
+                render_quiz_list(data.quizzes)
+                if (window.location.pathname.indexOf('/quiz/') != -1) {
+                    $('#page-content-wrapper').load(' #page-content-wrapper', function() {$(this).children().unwrap()})
+                }
+                $.notify(data.quizzes.length < quiz_count ? "quiz closed" : "new quiz available")
             }
+            student_quiz_version = data.quiz_version
+        },
+        error: function(response){
+        },
+    });
+}
 
+function refresh_session_count(session_count) {
+    if (session_count) {
+        $("#footer-div").html("Number of users online: " + session_count)
+    }
+}
+
+function render_quiz_list(quizzes) {
+    /* rebuild the sidebar quiz dropdown, same markup as sidebar.html */
+    var quiz_list = $('#current_quiz_list').empty()
+    if (quizzes.length == 0) {
+        return
+    }
+    quiz_list.append('<a class="dropdown-toggle" data-toggle="dropdown" href="#" role="button" aria-expanded="false">Available Quizzes <span class="badge">' + quizzes.length + '</span></a>')
+    var inner = $('<ul id="current_quiz_list_inner" class="dropdown-menu" role="menu"></ul>')
+    for (var i = 0; i < quizzes.length; i++) {
+        inner.append($('<li></li>').append($('<a></a>').attr('href', quizzes[i].url).text(' ' + quizzes[i].question + ' ')))
+    }
+    quiz_list.append(inner)
+}
+
+function refresh_state() {
+    /* confidence meter, footer and quiz list in one cache backed request */
+    $.ajax({
+        type: "GET",
+        url:  "/state/",
+        dataType: 'json',
+        success: function (data) {
+            refresh_confidence(data.confidence)
+            refresh_session_count(data.session_count)
+            render_quiz_list(data.quizzes)
         },
         error: function(response){
         },
     });
 }
 
+function refresh_quiz_list(quiz_events) {
+    /* update the quiz list and notify for each quiz opened or closed */
+    refresh_state()
+    /* only quiz pages show a quiz outside of the sidebar */
+    if (window.location.pathname.indexOf('/quiz/') != -1) {
+        $('#page-content-wrapper').load(' #page-content-wrapper', function() {$(this).children().unwrap()})
+    }
+    for (var i = 0; i < quiz_events.length; i++) {
+        if (quiz_events[i].visible) {
+            $.notify("new quiz available")
+        } else {
+            $.notify("quiz closed")
+        }
+    }
+}
+
+var live_poll_error_interval = 5000
+
+function live_poll(cursor, handler) {
+    /* long poll, the server only responds once something has changed */
+    $.ajax({
+        type: "GET",
+        url:  "/live_poll/",
+        dataType: 'json',
+        data: cursor == null ? {} : {'cursor': cursor},
+        success: function (data) {
+            handler(data)
+            /* retry is only sent when the server was too busy to hold the request open */
+            setTimeout(function() { live_poll(data.cursor, handler) }, data.retry || 0)
+        },
+        error: function(response){
+            setTimeout(function() { live_poll(cursor, handler) }, live_poll_error_interval)
+        },
+    });
+}
+
+function student_live_update(data) {
+    if (typeof data.confidence !== 'undefined') {
+        refresh_confidence(data.confidence)
+    }
+    if (typeof data.session_count !== 'undefined') {
+        refresh_session_count(data.session_count)
+    }
+    if (typeof data.quiz_events !== 'undefined') {
+        refresh_quiz_list(data.quiz_events)
+    } else if (data.resync) {
+        /* missed events, quizzes may have changed */
+        refresh_quiz_list([])
+    }
+}
+
 function vote(vote) {
     vote = typeof vote !== 'undefined' ? {vote:vote} : {};
     $.ajax({
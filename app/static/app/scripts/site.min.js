@@ -1 +1,40 @@
-function refresh_confidence(n){good=n.good_confidence_meter_data,neutral=n.neutral_confidence_meter_data,bad=n.bad_confidence_meter_data,sum=good+neutral+bad,good=100*good/sum,neutral=100*neutral/sum,bad=100*bad/sum,$("#progress-bar-good").attr("style","width: "+good+"%"),$("#progress-bar-neutral").attr("style","width: "+neutral+"%"),$("#progress-bar-bad").attr("style","width: "+bad+"%"),$("#good-btn").html(1==n.current?"good<span class='glyphicon glyphicon-ok'></span>":"good"),$("#neutral-btn").html(0==n.current?"neutral<span class='glyphicon glyphicon-ok'></span>":"neutral"),$("#bad-btn").html(-1==n.current?"bad<span class='glyphicon glyphicon-ok'></span>":"bad")}function student_poll(n){$.ajax({type:"GET",url:"/student_poll/",dataType:"json",data:{quiz_length:n},success:function(n){refresh_confidence(n),n.quiz_difference>0?($("#current_quiz_list").load(" #current_quiz_list",function(){$(this).children().unwrap()}),$("#page-content-wrapper").load(" #page-content-wrapper",function(){$(this).children().unwrap()}),$.notify("quiz closed")):n.quiz_difference<0&&($("#current_quiz_list").load(" #current_quiz_list",function(){$(this).children().unwrap()}),$("#page-content-wrapper").load(" #page-content-wrapper",function(){$(this).children().unwrap()}),$.notify("new quiz available"))},error:function(){}})}function vote(n){n="undefined"!=typeof n?{vote:n}:{},$.ajax({type:"GET",url:"/vote/",dataType:"json",data:n,success:function(n){refresh_confidence(n)},error:function(){}})}function addClickHandlers(){$("#good-btn").click(function(){vote(1)}),$("#neutral-btn").click(function(){vote(0)}),$("#bad-btn").click(function(){vote(-1)})}$("#menu-toggle").click(function(n){n.preventDefault(),$("#wrapper").toggleClass("toggled"),$("#toggle-arrow").toggleClass("glyphicon glyphicon-chevron-right white glyphicon glyphicon-chevron-left white")}),$(document).ready(addClickHandlers);
\ No newline at end of file
+$("#menu-toggle").click(function(e){e.preventDefault();$("#wrapper").toggleClass("toggled");$("#toggle-arrow").toggleClass("glyphicon glyphicon-chevron-right white glyphicon glyphicon-chevron-left white");});function refresh_confidence(data){good=data["good_confidence_meter_data"]
+neutral=data["neutral_confidence_meter_data"]
+bad=data["bad_confidence_meter_data"]
+sum=good+neutral+bad
+good=good*100/sum
+neutral=neutral*100/sum
+bad=bad*100/sum
+$("#progress-bar-good").attr("style","width: "+good+"%");$("#progress-bar-neutral").attr("style","width: "+neutral+"%");$("#progress-bar-bad").attr("style","width: "+bad+"%");if(data.current==1){$("#good-btn").html("good<span class='glyphicon glyphicon-ok'></span>")}else{$("#good-btn").html("good")}
+if(data.current==0){$("#neutral-btn").html("neutral<span class='glyphicon glyphicon-ok'></span>")}else{$("#neutral-btn").html("neutral")}
+if(data.current==-1){$("#bad-btn").html("bad<span class='glyphicon glyphicon-ok'></span>")}else{$("#bad-btn").html("bad")}}
+var student_quiz_version=null
+function student_poll(){$.ajax({type:"GET",url:"/student_poll/",dataType:'json',data:student_quiz_version==null?{}:{'quiz_version':student_quiz_version},success:function(data){refresh_confidence(data)
+if(data.quiz_unchanged){return}
+if(student_quiz_version!=null){var quiz_count=$('#current_quiz_list_inner li').length
+render_quiz_list(data.quizzes)
+if(window.location.pathname.indexOf('/quiz/')!=-1){$('#page-content-wrapper').load(' #page-content-wrapper',function(){$(this).children().unwrap()})}
+$.notify(data.quizzes.length<quiz_count?"quiz closed":"new quiz available")}
+student_quiz_version=data.quiz_version},error:function(response){},});}
+function refresh_session_count(session_count){if(session_count){$("#footer-div").html("Number of users online: "+session_count)}}
+function render_quiz_list(quizzes){var quiz_list=$('#current_quiz_list').empty()
+if(quizzes.length==0){return}
+quiz_list.append('<a class="dropdown-toggle" data-toggle="dropdown" href="#" role="button" aria-expanded="false">Available Quizzes <span class="badge">'+quizzes.length+'</span></a>')
+var inner=$('<ul id="current_quiz_list_inner" class="dropdown-menu" role="menu"></ul>')
+for(var i=0;i<quizzes.length;i++){inner.append($('<li></li>').append($('<a></a>').attr('href',quizzes[i].url).text(' '+quizzes[i].question+' ')))}
+quiz_list.append(inner)}
+function refresh_state(){$.ajax({type:"GET",url:"/state/",dataType:'json',success:function(data){refresh_confidence(data.confidence)
+refresh_session_count(data.session_count)
+render_quiz_list(data.quizzes)},error:function(response){},});}
+function refresh_quiz_list(quiz_events){refresh_state()
+if(window.location.pathname.indexOf('/quiz/')!=-1){$('#page-content-wrapper').load(' #page-content-wrapper',function(){$(this).children().unwrap()})}
+for(var i=0;i<quiz_events.length;i++){if(quiz_events[i].visible){$.notify("new quiz available")}else{$.notify("quiz closed")}}}
+var live_poll_error_interval=5000
+function live_poll(cursor,handler){$.ajax({type:"GET",url:"/live_poll/",dataType:'json',data:cursor==null?{}:{'cursor':cursor},success:function(data){handler(data)
+setTimeout(function(){live_poll(data.cursor,handler)},data.retry||0)},error:function(response){setTimeout(function(){live_poll(cursor,handler)},live_poll_error_interval)},});}
+function student_live_update(data){if(typeof data.confidence!=='undefined'){refresh_confidence(data.confidence)}
+if(typeof data.session_count!=='undefined'){refresh_session_count(data.session_count)}
+if(typeof data.quiz_events!=='undefined'){refresh_quiz_list(data.quiz_events)}else if(data.resync){refresh_quiz_list([])}}
+function vote(vote){vote=typeof vote!=='undefined'?{vote:vote}:{};$.ajax({type:"GET",url:"/vote/",dataType:'json',data:vote,success:function(data){refresh_confidence(data)},error:function(response){},});}
+function addClickHandlers(){$("#good-btn").click(function(){vote(1)});$("#neutral-btn").click(function(){vote(0)});$("#bad-btn").click(function(){vote(-1)});}
+$(document).ready(addClickHandlers);
\ No newline at end of file
@@ -2,6 +2,9 @@ from django.template import Library
 from django.contrib.admin.templatetags.admin_list import results, result_headers, result_hidden_fields
 from django.core import urlresolvers
 
+from app.generations import get_generations
+from app.highlighting import get_stylesheet_url
+
 register = Library()
 
 # override functions from django admin to make it do what i want
@@ -41,4 +44,19 @@ def current_url_equals(context, url_name, **kwargs):
             resolved_kwarg = resolved.kwargs.get(key)
             if not resolved_kwarg or kwarg != resolved_kwarg:
                 return False
-    return matches
\ No newline at end of file
+    return matches
+
+
+@register.filter
+def generation(namespace, id=None):
+    # current generation of a cache namespace, for keying cached fragments on
+    # 'lecture'|generation:current_lecture.id reads the generation of that one lecture
+    if id is not None:
+        namespace = '%s_%s' % (namespace, id)
+    return get_generations(namespace)[0]
+
+
+@register.simple_tag
+def code_stylesheet(style='default'):
+    # link to the shared colours for highlighted code
+    return '<link rel="stylesheet" type="text/css" href="%s" />' % get_stylesheet_url(style)
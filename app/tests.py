@@ -1,3 +1,5 @@
+import time
+
 from django.test import TestCase, RequestFactory, Client
 from django.core.urlresolvers import reverse
 from app.models import *
@@ -327,6 +329,209 @@ class Quiz_Usage(TestCase):
 		self.assertEquals(QuizChoice.objects.get(id=3).times_chosen, 3)
 		self.assertEquals(QuizChoice.objects.get(id=4).times_chosen, 4)
 
+		# the choices and all counts come from two queries, and are then served from cache
+		with self.assertNumQueries(2):
+			results = get_live_quiz_results(1)
+		self.assertEquals(results, {'counts': {1: 2, 2: 1, 3: 3, 4: 4, None: 0}, 'total': 10, 'max': 4})
+		with self.assertNumQueries(0):
+			get_live_quiz_results(1)
+
+		create_superuser(username="admin", password="password")
+		c=Client()
+		c.post(reverse('login'), data={'username': 'admin', 'password': 'password'})
+		response = c.get(reverse('quiz_results_detail', kwargs={'quiz_id': 1}))
+		self.assertContains(response, 'Submissions collected: <span id="submission-count">10</span>')
+		self.assertEquals([qc['times_chosen'] for qc in response.context['quiz_choices_summary']], [2, 1, 3, 4])
+		self.assertEquals([qc['relative_percentage'] for qc in response.context['quiz_choices_summary']], [50, 25, 75, 100])
+
+	def test_live_results(self):
+		l1=Lecture.objects.create(title="Lecture 1")
+		q1=Quiz.objects.create(question="question", visible=True, Lecture=l1)
+		c1=QuizChoice.objects.create(choice="yes", Quiz=q1, correct=True)
+		c2=QuizChoice.objects.create(choice="no", Quiz=q1, correct=False)
+		create_superuser(username="admin", password="password")
+		admin=Client()
+		admin.post(reverse('login'), data={'username': 'admin', 'password': 'password'})
+		url = reverse('quiz_results_live', kwargs={'quiz_id': q1.id})
+		data = json.loads(admin.get(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest').content)
+		self.assertEquals((data['total'], data['submissions'], data['cursor']), (0, [], 0))
+
+		# answers are counted as they are saved, the counters are not recounted from the database
+		for username, choice in (("jack", c1), ("jill", c2), ("bob", c1)):
+			user=create_student(username=username, password="password")
+			c=Client()
+			c.post(reverse('login'), data={'username': username, 'password': 'password'})
+			c.post(reverse('quiz', kwargs={'lecture_id':l1.id, 'lecture_slug':l1.slug, 'quiz_id':q1.id, 'quiz_slug':q1.slug}), data={'choices':choice.id, 'user':user.id, 'quiz':q1.id})
+		flush_quiz_answers()
+		with self.assertNumQueries(0):
+			results = get_live_quiz_results(q1.id)
+		self.assertEquals(results['counts'], {c1.id: 2, c2.id: 1, None: 0})
+		self.assertEquals((results['total'], results['max']), (3, 2))
+
+		# only submissions after the cursor are sent
+		data = json.loads(admin.get(url, {'cursor': 0}, HTTP_X_REQUESTED_WITH='XMLHttpRequest').content)
+		self.assertEquals(data['submissions'], [["jack", "yes"], ["jill", "no"], ["bob", "yes"]])
+		self.assertEquals(data['counts'], {str(c1.id): 2, str(c2.id): 1, 'null': 0})
+		cursor = data['cursor']
+		self.assertEquals(json.loads(admin.get(url, {'cursor': cursor}, HTTP_X_REQUESTED_WITH='XMLHttpRequest').content)['submissions'], [])
+
+		# a full page tells the client to ask again from the new cursor
+		with self.settings(QUIZ_RESULTS_FEED_SIZE=2):
+			data = json.loads(admin.get(url, {'cursor': 0}, HTTP_X_REQUESTED_WITH='XMLHttpRequest').content)
+			self.assertEquals((data['submissions'], data['more']), ([["jack", "yes"], ["jill", "no"]], True))
+			data = json.loads(admin.get(url, {'cursor': data['cursor']}, HTTP_X_REQUESTED_WITH='XMLHttpRequest').content)
+			self.assertEquals((data['submissions'], data['more']), ([["bob", "yes"]], False))
+		response = admin.get(reverse('quiz_results_detail', kwargs={'quiz_id': q1.id}))
+		self.assertEquals(response.context['results_cursor'], cursor)
+
+	def test_answer_state(self):
+		l1=Lecture.objects.create(title="Lecture 1")
+		q1=Quiz.objects.create(question="question 1", visible=True, Lecture=l1)
+		c1=QuizChoice.objects.create(choice="yes", Quiz=q1, correct=True)
+		c2=QuizChoice.objects.create(choice="no", Quiz=q1, correct=False)
+		q2=Quiz.objects.create(question="question 2", visible=True, Lecture=l1)
+		q3=Quiz.objects.create(question="question 3", visible=True, Lecture=l1)
+		user=create_student(username="jack", password="password")
+		QuizChoiceSelected.objects.create(User=user, QuizChoice=c2)
+		QuizChoiceSelected.objects.create(User=user, Quiz=q2, answer="answer")
+
+		# every quiz in one query, then from cache
+		with self.assertNumQueries(1):
+			states = get_answer_states(user, [q1.id, q2.id, q3.id])
+		self.assertEquals(states, {q1.id: [(c2.id, None)], q2.id: [(None, "answer")], q3.id: []})
+		with self.assertNumQueries(0):
+			self.assertEquals(get_answer_state(user, q3), [])
+
+		c=Client()
+		c.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+		response = c.get(reverse('quiz', kwargs={'lecture_id':l1.id, 'lecture_slug':l1.slug, 'quiz_id':q1.id, 'quiz_slug':q1.slug}))
+		self.assertContains(response, "WRONG")
+		response = c.post(reverse('quiz', kwargs={'lecture_id':l1.id, 'lecture_slug':l1.slug, 'quiz_id':q3.id, 'quiz_slug':q3.slug}), data={'answer':'new answer', 'user':user.id, 'quiz':q3.id}, follow=True)
+		# the submission replaces the cached state straight away
+		self.assertEquals(get_answer_state(user, q3), [(None, "new answer")])
+		self.assertContains(response, "new answer")
+
+	def test_answer_queue(self):
+		l1=Lecture.objects.create(title="Lecture 1")
+		q1=Quiz.objects.create(question="question 1", visible=True, Lecture=l1)
+		c1=QuizChoice.objects.create(choice="yes", Quiz=q1, correct=True)
+		c2=QuizChoice.objects.create(choice="no", Quiz=q1, correct=False)
+		q2=Quiz.objects.create(question="question 2", visible=True, Lecture=l1)
+		jack=create_student(username="jack", password="password")
+		jill=create_student(username="jill", password="password")
+		# hold the flush back so the queue can be seen
+		cache.set('quiz_answer_flush_due', True, 60)
+
+		self.assertTrue(queue_quiz_answer(jack, q1, choice_ids=[c1.id]))
+		self.assertTrue(queue_quiz_answer(jill, q1, choice_ids=[c2.id]))
+		self.assertTrue(queue_quiz_answer(jack, q2, answer="answer"))
+		# a second submission is turned away, even before the first is saved
+		self.assertFalse(queue_quiz_answer(jack, q1, choice_ids=[c2.id]))
+		self.assertEquals(QuizChoiceSelected.objects.count(), 0)
+		# the user reads back their own answer while it waits
+		self.assertEquals(get_answer_states(jack, [q1.id, q2.id]), {q1.id: [(c1.id, None)], q2.id: [(None, "answer")]})
+
+		self.assertEquals(flush_quiz_answers(), 3)
+		self.assertEquals(sorted(QuizChoiceSelected.objects.values_list('User__username', 'QuizChoice', 'Quiz', 'answer')),
+			[("jack", None, q2.id, "answer"), ("jack", c1.id, None, None), ("jill", c2.id, None, None)])
+		self.assertEquals(get_answer_state(jill, q1), [(c2.id, None)])
+		self.assertFalse(queue_quiz_answer(jill, q1, choice_ids=[c1.id]))
+		self.assertEquals(flush_quiz_answers(), 0)
+		self.assertEquals(QuizChoiceSelected.objects.count(), 3)
+
+	def test_answer_queue_gap(self):
+		l1=Lecture.objects.create(title="Lecture 1")
+		q1=Quiz.objects.create(question="question 1", visible=True, Lecture=l1)
+		jack=create_student(username="jack", password="password")
+		jill=create_student(username="jill", password="password")
+		cache.set('quiz_answer_flush_due', True, 60)
+
+		# a writer that has taken its slot but not stored it yet holds the flush back
+		cache.add('quiz_answer_queue_tail', 0, None)
+		slot = cache.incr('quiz_answer_queue_tail')
+		self.assertTrue(queue_quiz_answer(jill, q1, answer="answer"))
+		self.assertEquals(flush_quiz_answers(), 0)
+		self.assertEquals(cache.get('quiz_answer_queue_head'), 0)
+		cache.set('quiz_answer_queue_%s' % slot, (jack.id, q1.id, [(None, "first")]), 60)
+		self.assertEquals(flush_quiz_answers(), 2)
+		self.assertEquals(sorted(QuizChoiceSelected.objects.values_list('User__username', 'answer')), [("jack", "first"), ("jill", "answer")])
+
+		# a slot that never turns up is passed over once QUEUE_SLOT_WAIT has gone by
+		slot = cache.incr('quiz_answer_queue_tail')
+		self.assertEquals(flush_quiz_answers(), 0)
+		cache.set('quiz_answer_queue_%s_missing' % slot, time.time() - settings.QUEUE_SLOT_WAIT, 60)
+		self.assertEquals(flush_quiz_answers(), 0)
+		self.assertEquals(cache.get('quiz_answer_queue_head'), slot)
+
+	def test_answer_state_race(self):
+		l1=Lecture.objects.create(title="Lecture 1")
+		q1=Quiz.objects.create(question="question 1", visible=True, Lecture=l1)
+		c1=QuizChoice.objects.create(choice="yes", Quiz=q1, correct=True)
+		jack=create_student(username="jack", password="password")
+		cache.set('quiz_answer_flush_due', True, 60)
+		get_live_quiz_results(q1.id)
+
+		# a reader that loaded [] before the flush saved the answer writes it back after the flush
+		stale_keys = get_answer_state_keys(jack.id, [q1.id])
+		self.assertTrue(queue_quiz_answer(jack, q1, choice_ids=[c1.id]))
+		self.assertEquals(flush_quiz_answers(), 1)
+		cache.set(stale_keys[q1.id], [], 60)
+		self.assertEquals(get_answer_state(jack, q1), [(c1.id, None)])
+		self.assertFalse(queue_quiz_answer(jack, q1, choice_ids=[c1.id]))
+
+		# a submission queued again after it was saved is neither saved nor counted twice
+		cache.set('quiz_answer_queue_%s' % take_queue_slot('quiz_answer_queue'), (jack.id, q1.id, [(c1.id, None)]), 60)
+		self.assertEquals(flush_quiz_answers(), 1)
+		self.assertEquals(QuizChoiceSelected.objects.count(), 1)
+		self.assertEquals(get_live_quiz_results(q1.id)['counts'][c1.id], 1)
+
+	def test_live_results_seed(self):
+		l1=Lecture.objects.create(title="Lecture 1")
+		q1=Quiz.objects.create(question="question 1", visible=True, Lecture=l1)
+		c1=QuizChoice.objects.create(choice="yes", Quiz=q1, correct=True)
+		jack=create_student(username="jack", password="password")
+		jill=create_student(username="jill", password="password")
+		cache.set('quiz_answer_flush_due', True, 60)
+
+		# an answer queued before the counters are seeded is counted once it is saved
+		self.assertTrue(queue_quiz_answer(jack, q1, choice_ids=[c1.id]))
+		self.assertEquals(get_live_quiz_results(q1.id)['total'], 0)
+		self.assertEquals(flush_quiz_answers(), 1)
+		self.assertEquals(get_live_quiz_results(q1.id)['total'], 1)
+
+		# counters are not seeded while a flush may be between saving and counting
+		cache.delete('%s_choices' % get_live_quiz_results_namespace(q1.id))
+		self.assertTrue(queue_quiz_answer(jill, q1, choice_ids=[c1.id]))
+		cache.add('quiz_answer_flush_lock', True, 60)
+		self.assertEquals(get_live_quiz_results(q1.id)['total'], 1)
+		self.assertEquals(cache.get('%s_choices' % get_live_quiz_results_namespace(q1.id)), None)
+		cache.delete('quiz_answer_flush_lock')
+		self.assertEquals(flush_quiz_answers(), 1)
+		self.assertEquals(get_live_quiz_results(q1.id)['total'], 2)
+
+	def test_answer_queue_evicted_tail(self):
+		l1=Lecture.objects.create(title="Lecture 1")
+		q1=Quiz.objects.create(question="question 1", visible=True, Lecture=l1)
+		q2=Quiz.objects.create(question="question 2", visible=True, Lecture=l1)
+		jack=create_student(username="jack", password="password")
+		cache.set('quiz_answer_flush_due', True, 60)
+		self.assertTrue(queue_quiz_answer(jack, q1, answer="first"))
+		self.assertEquals(flush_quiz_answers(), 1)
+		self.assertEquals(cache.get('quiz_answer_queue_head'), 1)
+
+		# a tail evicted while the head is past 0 carries on from the head instead of starting again below it
+		cache.delete('quiz_answer_queue_tail')
+		self.assertTrue(queue_quiz_answer(jack, q2, answer="second"))
+		self.assertEquals(cache.get('quiz_answer_queue_tail'), 2)
+		self.assertEquals(flush_quiz_answers(), 1)
+		self.assertEquals(sorted(QuizChoiceSelected.objects.filter(User=jack).values_list('answer', flat=True)), ["first", "second"])
+
+	def test_freeform_results(self):
+		quiz = Rand.quiz()
+		for i in xrange(3):
+			QuizChoiceSelected.objects.create(User=Rand.user(), Quiz=quiz, answer="answer")
+		self.assertEquals(get_live_quiz_results(quiz.id), {'counts': {None: 3}, 'total': 3, 'max': 3})
+
 	def test_quiz_type1(self):
 		correct = [False, False, False, False]
 		for i in xrange(4):
@@ -357,6 +562,22 @@ class Quiz_Usage(TestCase):
 			Rand.quizchoice(correct=correct[i])
 		self.assertEquals(Quiz.objects.first().quiz_type, QuizType.MULTIMCQ)
 
+	def test_quiz_type_stored(self):
+		quiz = Quiz.objects.create(question="question", Lecture=Lecture.objects.create(title="Lecture 1"))
+		self.assertEquals(quiz.quiz_type, QuizType.FREEFORM)
+		choice = QuizChoice.objects.create(choice="a", Quiz=quiz, correct=True)
+		QuizChoice.objects.create(choice="b", Quiz=quiz, correct=False)
+		quiz = Quiz.objects.get(id=quiz.id)
+		# stored on the quiz, reading it needs no query
+		with self.assertNumQueries(0):
+			self.assertEquals(quiz.quiz_type, QuizType.SINGLEMCQ)
+			self.assertEquals(quiz.correct_count, 1)
+		choice.delete()
+		self.assertEquals(Quiz.objects.get(id=quiz.id).quiz_type, QuizType.ZEROMCQ)
+		quiz.answer = "b"
+		quiz.save()
+		self.assertEquals(Quiz.objects.get(id=quiz.id).quiz_type, QuizType.FREEFORM)
+
 
 class Get_Request(TestCase):
 
@@ -674,3 +895,675 @@ class Check_correct_URL(TestCase):
 		
 
 		self.assertEquals(Thread.objects.get(id=02).title, 'testing2')
+
+
+class Confidence_Meter_Test(TestCase):
+
+	def tearDown(self):
+		cache.clear()
+
+	def vote(self, c, vote):
+		return c.get(reverse('vote'), data={'vote': vote}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+	def test_vote_deltas(self):
+		u1=create_student(username="jack", password="password")
+		u2=create_student(username="harry", password="harry")
+		UserProfile.objects.filter(user=u2).update(seat_location=SeatLocation.LEFT)
+		c1=Client()
+		c1.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+		c2=Client()
+		c2.post(reverse('login'), data={'username': 'harry', 'password': 'harry'})
+
+		self.vote(c1, 1)
+		response = self.vote(c2, -1)
+		self.assertEquals(response.status_code, 200)
+		data = get_confidence_meter()
+		self.assertEquals(data['good_confidence_meter_data'], 1)
+		self.assertEquals(data['bad_confidence_meter_data'], 1)
+		self.assertEquals(data['bad_left'], 1)
+
+		# changing a vote moves the tally instead of adding to it
+		self.vote(c2, 0)
+		self.vote(c1, 1)
+		data = get_confidence_meter()
+		self.assertEquals(data['good_confidence_meter_data'], 1)
+		self.assertEquals(data['neutral_confidence_meter_data'], 1)
+		self.assertEquals(data['bad_confidence_meter_data'], 0)
+		self.assertEquals(data['bad_left'], 0)
+
+		# live counters agree with a full rebuild from the db
+		self.assertEquals(data, rebuild_confidence_meter())
+
+	def test_write_behind(self):
+		u1=create_student(username="jack", password="password")
+		c1=Client()
+		c1.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+
+		# the first vote of an interval flushes straight away
+		self.vote(c1, 1)
+		self.assertEquals(ConfidenceMeter.objects.get(User=u1).confidence, 1)
+
+		# later votes are only in cache until the next flush
+		self.vote(c1, -1)
+		self.vote(c1, 0)
+		self.assertEquals(ConfidenceMeter.objects.get(User=u1).confidence, 1)
+		self.assertEquals(get_user_confidence(u1), 0)
+		self.assertEquals(flush_confidence_votes(), 1)
+		self.assertEquals(ConfidenceMeter.objects.get(User=u1).confidence, 0)
+		self.assertEquals(ConfidenceMeter.objects.count(), 1)
+
+	def test_rebuild_waits_for_queue(self):
+		jack=create_student(username="jack", password="password")
+		c1=Client()
+		c1.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+		self.vote(c1, 1)
+		self.assertEquals(get_confidence_meter()['good_confidence_meter_data'], 1)
+
+		# a slot still being written keeps the vote behind it out of the db, the counters are left alone
+		cache.set('confidence_flush_due', True, 60)
+		slot = take_queue_slot('confidence_queue')
+		self.vote(c1, -1)
+		self.assertEquals(rebuild_confidence_meter(), None)
+		data = get_confidence_meter()
+		self.assertEquals((data['good_confidence_meter_data'], data['bad_confidence_meter_data']), (0, 1))
+
+		# once the writer stores its vote the queue drains, and the rebuild agrees with the counters
+		jill=create_student(username="jill", password="password")
+		cache.set('confidence_queue_%s' % slot, (jill.id, 0, timezone.now()), 60)
+		update_confidence_meter(old_confidence=None, new_confidence=0, seat_location=SeatLocation.MIDDLE)
+		data = get_confidence_meter()
+		self.assertEquals((data['good_confidence_meter_data'], data['neutral_confidence_meter_data'], data['bad_confidence_meter_data']), (0, 1, 1))
+		self.assertEquals(rebuild_confidence_meter(), data)
+		self.assertEquals(ConfidenceMeter.objects.count(), 2)
+
+	def test_write_behind_gap(self):
+		jack=create_student(username="jack", password="password")
+		jill=create_student(username="jill", password="password")
+		cache.set('confidence_flush_due', True, 60)
+
+		# a writer that has taken its slot but not stored it yet holds the flush back
+		cache.add('confidence_queue_tail', 0, None)
+		slot = cache.incr('confidence_queue_tail')
+		queue_user_confidence(jill, 1)
+		self.assertEquals(flush_confidence_votes(), 0)
+		cache.set('confidence_queue_%s' % slot, (jack.id, -1, timezone.now()), 60)
+		self.assertEquals(flush_confidence_votes(), 2)
+		self.assertEquals(sorted(ConfidenceMeter.objects.values_list('User__username', 'confidence')), [("jack", -1), ("jill", 1)])
+
+	def test_write_behind_evicted_tail(self):
+		jack=create_student(username="jack", password="password")
+		cache.set('confidence_flush_due', True, 60)
+		queue_user_confidence(jack, 1)
+		queue_user_confidence(jack, 0)
+		self.assertEquals(flush_confidence_votes(), 1)
+		self.assertEquals(cache.get('confidence_queue_head'), 2)
+
+		# a tail evicted while the head is past 0 carries on from the head instead of starting again below it
+		cache.delete('confidence_queue_tail')
+		queue_user_confidence(jack, -1)
+		self.assertEquals(cache.get('confidence_queue_tail'), 3)
+		self.assertEquals(flush_confidence_votes(), 1)
+		self.assertEquals(ConfidenceMeter.objects.get(User=jack).confidence, -1)
+
+		# and one that started again below the head is moved past it
+		cache.set('confidence_queue_tail', 1, None)
+		queue_user_confidence(jack, 1)
+		self.assertEquals(cache.get('confidence_queue_tail'), 4)
+		self.assertEquals(flush_confidence_votes(), 1)
+		self.assertEquals(ConfidenceMeter.objects.get(User=jack).confidence, 1)
+
+	def test_user_confidence_cache(self):
+		jack=create_student(username="jack", password="password")
+		cache.set('confidence_flush_due', True, 60)
+
+		# a user who has not voted is only looked up once
+		self.assertEquals(get_user_confidence(jack), None)
+		with self.assertNumQueries(0):
+			self.assertEquals(get_user_confidence(jack), None)
+
+		# a queued vote is read back without flushing, even once the cached vote has gone
+		queue_user_confidence(jack, 1)
+		cache.delete("User_confidence_%s" % (jack.id))
+		with self.assertNumQueries(0):
+			self.assertEquals(get_user_confidence(jack), 1)
+		self.assertEquals(ConfidenceMeter.objects.count(), 0)
+
+	def test_history(self):
+		u1=create_student(username="jack", password="password")
+		l1=Lecture.objects.create(title="Lecture 1")
+		c1=Client()
+		c1.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+		self.vote(c1, 1)
+		self.vote(c1, -1)
+		flush_confidence_votes()
+		self.assertEquals(ConfidenceVote.objects.filter(Lecture=l1).count(), 2)
+
+		# resetting the live meter keeps the history
+		c1.get(reverse('vote'), data={}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+		reset_confidence_votes()
+		self.assertEquals(ConfidenceMeter.objects.count(), 0)
+		self.assertEquals(ConfidenceVote.objects.count(), 2)
+
+		self.assertEquals(ConfidenceBucket.compact(before=timezone.now() + timedelta(minutes=1)), 2)
+		self.assertEquals(ConfidenceVote.objects.count(), 0)
+		bucket = ConfidenceBucket.objects.get(Lecture=l1)
+		self.assertEquals((bucket.good, bucket.bad, bucket.bad_middle), (1, 1, 1))
+
+
+class Live_Poll_Test(TestCase):
+
+	def tearDown(self):
+		cache.clear()
+
+	def poll(self, c, cursor=None):
+		data = {} if cursor == None else {'cursor': cursor}
+		return json.loads(c.get(reverse('live_poll'), data=data, HTTP_X_REQUESTED_WITH='XMLHttpRequest').content)
+
+	def test_confidence_events(self):
+		from app.live_updates import get_live_events
+		cursor = get_live_event_cursor()
+		# a burst of votes wakes the long polls once
+		for i in xrange(3):
+			publish_live_event('confidence')
+		self.assertEquals(get_live_events(cursor), (cursor + 1, [('confidence', None)]))
+		# the held back event goes out once the interval is over
+		cache.delete('live_event_due_confidence')
+		self.assertEquals(get_live_events(cursor + 1), (cursor + 2, [('confidence', None)]))
+		self.assertEquals(get_live_events(cursor + 2), (cursor + 2, []))
+
+	def test_quiz_events(self):
+		create_student(username="jack", password="password")
+		l1=Lecture.objects.create(title="Lecture 1")
+		c=Client()
+		c.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+
+		# first poll sends the full state without waiting
+		data = self.poll(c)
+		self.assertTrue('confidence' in data)
+		self.assertFalse('resync' in data)
+		cursor = data['cursor']
+
+		q1=Quiz.objects.create(question="question", visible=True, Lecture=l1)
+		data = self.poll(c, cursor)
+		self.assertEquals(data['quiz_events'], [{'quiz': q1.id, 'visible': True}])
+		self.assertFalse('confidence' in data)
+
+		# saving without changing visibility is not pushed, closing is
+		q1.question = "changed"
+		q1.save()
+		q1.visible = False
+		q1.save()
+		data = self.poll(c, data['cursor'])
+		self.assertEquals(data['quiz_events'], [{'quiz': q1.id, 'visible': False}])
+
+		# a cursor that can no longer be replayed gets the full state
+		data = self.poll(c, data['cursor'] + 1)
+		self.assertTrue(data['resync'])
+		self.assertTrue('confidence' in data)
+
+	def test_state(self):
+		create_student(username="jack", password="password")
+		l1=Lecture.objects.create(title="Lecture 1")
+		c=Client()
+		c.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+		self.assertEquals(c.get(reverse('state')).status_code, 404)
+
+		data = json.loads(c.get(reverse('state'), HTTP_X_REQUESTED_WITH='XMLHttpRequest').content)
+		self.assertEquals(data['quizzes'], [])
+		self.assertEquals(data['session_count'], 1)
+		self.assertTrue('confidence' in data)
+		self.assertFalse('confidence_messages' in data)
+
+		q1=Quiz.objects.create(question="question", visible=True, Lecture=l1)
+		new_data = json.loads(c.get(reverse('state'), HTTP_X_REQUESTED_WITH='XMLHttpRequest').content)
+		self.assertTrue(new_data['quiz_version'] > data['quiz_version'])
+		self.assertEquals(new_data['quizzes'], [{'id': q1.id, 'question': 'question', 'url': reverse('quiz', args=(l1.id, l1.slug, q1.id, q1.slug))}])
+
+		# editing a quiz without opening or closing it leaves the version alone
+		q1.question="edited"
+		q1.save()
+		data = json.loads(c.get(reverse('state'), HTTP_X_REQUESTED_WITH='XMLHttpRequest').content)
+		self.assertEquals(data['quiz_version'], new_data['quiz_version'])
+
+	def test_student_poll(self):
+		create_student(username="jack", password="password")
+		l1=Lecture.objects.create(title="Lecture 1")
+		q1=Quiz.objects.create(question="question", visible=True, Lecture=l1)
+		c=Client()
+		c.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+		poll = lambda version: json.loads(c.get(reverse('student_poll'), {'quiz_version': version}, HTTP_X_REQUESTED_WITH='XMLHttpRequest').content)
+		data = poll('')
+		version = data['quiz_version']
+		self.assertEquals([quiz['id'] for quiz in data['quizzes']], [q1.id])
+		self.assertTrue(poll(version)['quiz_unchanged'])
+
+		# editing a quiz leaves the version alone, opening and closing moves it even if the count is unchanged
+		q1.question = "new question"
+		q1.save()
+		self.assertTrue(poll(version)['quiz_unchanged'])
+		q2=Quiz.objects.create(question="question 2", visible=False, Lecture=l1)
+		c2=Client()
+		create_superuser(username="admin", password="password")
+		c2.post(reverse('login'), data={'username': 'admin', 'password': 'password'})
+		c2.post(reverse('quick_update'), {'quiz_close': q1.id}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+		c2.post(reverse('quick_update'), {'quiz_open': q2.id}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+		data = poll(version)
+		self.assertTrue(data['quiz_version'] > version)
+		self.assertEquals([quiz['id'] for quiz in data['quizzes']], [q2.id])
+
+
+class Confidence_Trend_Test(TestCase):
+
+	def tearDown(self):
+		cache.clear()
+
+	def test_ring_buffer(self):
+		from app.timeseries import store_confidence_trend_sample, downsample_confidence_trend
+		# start of the previous minute, still inside every tier
+		start = (int(time.time()) // 60 - 1) * 60
+		for i in xrange(10):
+			store_confidence_trend_sample(1, 300, (start + i, i, 1, 0))
+		self.assertEquals(len(get_confidence_trend(1)), 10)
+		# only samples after the cursor are returned
+		self.assertEquals(get_confidence_trend(1, since=start + 7), [(start + 8, 8, 1, 0), (start + 9, 9, 1, 0)])
+
+		downsample_confidence_trend(10, 360, 1, 300, start // 10)
+		self.assertEquals(get_confidence_trend(10), [(start, 4.5, 1.0, 0.0)])
+
+		# a full ring wraps around instead of growing
+		for i in xrange(600):
+			store_confidence_trend_sample(1, 300, (start + i, 0, 0, 0))
+		self.assertEquals(len(cache.get('confidence_trend_1')), 300)
+
+
+class Cache_Fill_Test(TestCase):
+
+	def tearDown(self):
+		cache.clear()
+
+	def test_single_flight(self):
+		from app.cache_helpers import fill_cache, get_or_fill_cache
+		calls = []
+		def fill():
+			calls.append(True)
+			return len(calls)
+		self.assertEquals(get_or_fill_cache('fill_test', fill, 5), 1)
+		self.assertEquals(get_or_fill_cache('fill_test', fill, 5), 1)
+		self.assertEquals(len(calls), 1)
+
+		# stale value is served while another process holds the lease
+		cache.set('fill_test', ('old', time.time() - 1), 30)
+		cache.add('fill_test_fill_lock', True, 5)
+		self.assertEquals(get_or_fill_cache('fill_test', fill, 5), 'old')
+		self.assertEquals(len(calls), 1)
+
+		# once the lease is released the stale value is refreshed
+		cache.delete('fill_test_fill_lock')
+		self.assertEquals(get_or_fill_cache('fill_test', fill, 5), 2)
+		self.assertEquals(cache.get('fill_test_fill_lock'), None)
+
+
+class Cached_Record_Test(TestCase):
+
+	def tearDown(self):
+		cache.clear()
+
+	def test_records(self):
+		import pickle
+		from app.generations import generation_key
+		u1=create_student(username="jack", password="password")
+		l1=Lecture.objects.create(title="Lecture 1")
+		q1=Quiz.objects.create(question="question", visible=True, Lecture=l1)
+		t1=Thread.objects.create(title="Chocolate", content="chocolate", Creator=u1, views=0, anonymous=False)
+		Post.objects.create(Thread=t1, content="Volvo is a car brand", Creator=u1, rank=1, anonymous=True)
+
+		quiz = filter_quiz_list(visible=True)[0]
+		self.assertEquals((quiz.Lecture.id, quiz.Lecture.slug, quiz.slug), (l1.id, l1.slug, q1.slug))
+		self.assertEquals(unicode(quiz), u"Lecture 1 question")
+		# lookups still hand back model instances
+		self.assertEquals(get_quiz_object(id=q1.id), q1)
+		self.assertEquals(get_thread_object(id=t1.id).Creator_name(), "jack")
+		self.assertEquals(unicode(filter_post_list(Thread=t1)[0].Creator_name), u"anonymous")
+		# related objects come from the record rather than another query
+		get_user_list()
+		u1 = User.objects.select_related('UserProfile').get(id=u1.id)
+		with self.assertNumQueries(0):
+			self.assertEquals(get_quiz_object(id=q1.id).Lecture.slug, l1.slug)
+			self.assertEquals(get_thread_object(id=t1.id).Creator.username, "jack")
+			self.assertEquals(get_user_object(id=u1.id).UserProfile.seat_location, u1.UserProfile.seat_location)
+		# users keep no password hash, it is only loaded if asked for
+		self.assertFalse('password' in UserRecord.fields)
+		user = get_user_object(id=u1.id)
+		self.assertEquals(user, u1)
+		self.assertTrue(user.check_password("password"))
+		# and saving a rebuilt user only writes the fields it kept
+		user = get_user_object(id=u1.id)
+		user.first_name = "Jack"
+		user.save()
+		self.assertTrue(User.objects.get(id=u1.id).check_password("password"))
+		# rows are much smaller than the pickled queryset they replace
+		get_quiz_list()
+		quiz_list = cache.get('%s_list' % generation_key('quiz', 'quiz'))
+		self.assertTrue(quiz_list != None)
+		self.assertTrue(len(pickle.dumps(quiz_list, -1)) * 2 < len(pickle.dumps(list(Quiz.objects.select_related().all()), -1)))
+
+		# old format cache values are refilled
+		cache.set('%s_list' % generation_key('lecture', 'lecture'), Lecture.objects.all(), 60)
+		self.assertEquals(get_lecture_list()[0].title, "Lecture 1")
+
+		c=Client()
+		c.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+		response = c.get(reverse('post', kwargs={'thread_id': t1.id, 'thread_slug': t1.slug}))
+		self.assertContains(response, "Volvo is a car brand")
+		self.assertContains(response, reverse('quiz', kwargs={'lecture_id': l1.id, 'lecture_slug': l1.slug, 'quiz_id': q1.id, 'quiz_slug': q1.slug}))
+		response = c.get(reverse('thread'))
+		self.assertContains(response, "Chocolate")
+
+	def test_index_lookups(self):
+		from app.generations import generation_key
+		u1=create_student(username="jack", password="password")
+		l1=Lecture.objects.create(title="Lecture 1")
+		l2=Lecture.objects.create(title="Lecture 2")
+		q1=Quiz.objects.create(question="question", visible=True, Lecture=l1)
+		q2=Quiz.objects.create(question="another", visible=False, Lecture=l2)
+		t1=Thread.objects.create(title="Chocolate", content="chocolate", Creator=u1, views=0, anonymous=False)
+
+		get_quiz_list()
+		namespace = generation_key('quiz', 'quiz')
+		self.assertTrue(cache.get('%s_record_%s' % (namespace, q2.id)) != None)
+		# once the list has been filled, lookups are served from the per object keys and indexes
+		cache.delete('%s_list' % namespace)
+		with self.assertNumQueries(0):
+			self.assertEquals(get_quiz_object(id=q2.id), q2)
+			self.assertEquals([q.id for q in filter_quiz_list(visible=True)], [q1.id])
+			self.assertEquals([q.id for q in filter_quiz_list(Lecture=l2)], [q2.id])
+			self.assertEquals(filter_quiz_list(visible=True, Lecture=l2), [])
+		self.assertRaises(Quiz.DoesNotExist, get_quiz_object, id=100)
+
+		# a new post invalidates the thread index
+		self.assertEquals(filter_post_list(Thread=t1), [])
+		p1=Post.objects.create(Thread=t1, content="Volvo is a car brand", Creator=u1, rank=1, anonymous=True)
+		self.assertEquals([p.id for p in filter_post_list(Thread=t1)], [p1.id])
+
+	def test_generations(self):
+		u1=create_student(username="jack", password="password")
+		l1=Lecture.objects.create(title="Lecture 1")
+		q1=Quiz.objects.create(question="question", visible=False, Lecture=l1)
+		self.assertEquals(filter_quiz_list(visible=True), [])
+		# a save turns over every quiz key at once
+		q1.visible = True
+		q1.save()
+		self.assertEquals([q.id for q in filter_quiz_list(visible=True)], [q1.id])
+		# quizzes keep the lecture slug, renaming the lecture refreshes them
+		l1.title = "Lecture One"
+		l1.save()
+		self.assertEquals(get_quiz_list()[0].Lecture_title, "Lecture One")
+		QuizChoice.objects.create(choice="choice", Quiz=q1, correct=True)
+		self.assertEquals(len(filter_quizchoice_list(Quiz=q1)), 1)
+		self.assertEquals(filter_quizchoice_list_for_correct(Quiz=q1, correct=False), [])
+		QuizChoice.objects.create(choice="other", Quiz=q1, correct=False)
+		self.assertEquals([qc.choice for qc in filter_quizchoice_list_for_correct(Quiz=q1, correct=False)], ["other"])
+		q1.delete()
+		self.assertEquals(get_quiz_list(), [])
+		# user and profile changes turn over the cached users
+		get_user_object(u1.id)
+		u1.first_name = "Jackie"
+		u1.save()
+		self.assertEquals(get_user_object(u1.id).first_name, "Jackie")
+		u2=create_student(username="jill", password="password")
+		self.assertEquals(len(get_user_list()), 2)
+		u2.delete()
+		self.assertEquals(len(get_user_list()), 1)
+		# deleting a reply refreshes its thread
+		t1=Thread.objects.create(title="thread", content="content", Creator=u1)
+		p1=Post.objects.create(Thread=t1, content="reply", Creator=u1, rank=1)
+		self.assertEquals(len(get_post_list()), 1)
+		p1.delete()
+		self.assertEquals(get_post_list(), [])
+
+
+class Presence_Test(TestCase):
+
+	def tearDown(self):
+		cache.clear()
+
+	def test_online_count(self):
+		from app.presence import record_presence, get_presence_bucket
+		create_student(username="jack", password="password")
+		create_student(username="harry", password="harry")
+		c1=Client()
+		c1.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+		c2=Client()
+		c2.post(reverse('login'), data={'username': 'harry', 'password': 'harry'})
+		self.assertEquals(get_session_count(), 0)
+		c1.get(reverse('thread'))
+		c1.get(reverse('thread'))
+		c2.get(reverse('thread'))
+		self.assertEquals(get_session_count(), 2)
+
+		# a user seen again in a later bucket is only counted once
+		bucket = get_presence_bucket()
+		cache.set('presence_user_100', bucket - 1, 60)
+		cache.set('presence_count_%s' % (bucket - 1), 1, 60)
+		self.assertEquals(get_session_count(), 3)
+		record_presence(100)
+		self.assertEquals(get_session_count(), 3)
+
+		c2.get(reverse('logout'))
+		self.assertEquals(get_session_count(), 2)
+
+
+class Session_Index_Test(TestCase):
+
+	def tearDown(self):
+		cache.clear()
+
+	def test_logout_everywhere(self):
+		from django.contrib.sessions.models import Session
+		u1=create_student(username="jack", password="password")
+		create_student(username="harry", password="harry")
+		clients = [Client(), Client()]
+		for c in clients:
+			c.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+		Client().post(reverse('login'), data={'username': 'harry', 'password': 'harry'})
+		self.assertEquals(UserSession.objects.filter(User=u1).count(), 2)
+		self.assertEquals(Session.objects.count(), 3)
+
+		# logging out of one client ends every session of that user only
+		clients[0].get(reverse('logout'))
+		self.assertEquals(UserSession.objects.filter(User=u1).count(), 0)
+		self.assertEquals(UserSession.objects.count(), 1)
+		self.assertFalse(Session.objects.filter(session_key=clients[1].cookies['sessionid'].value).exists())
+
+
+class Fragment_Cache_Test(TestCase):
+
+	def tearDown(self):
+		cache.clear()
+
+	def test_sidebar_and_navbar(self):
+		from app.generations import generation_key
+		from app.records import LectureRecord
+		create_student(username="jack", password="password")
+		l1=Lecture.objects.create(title="Lecture 1")
+		c=Client()
+		c.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+		url = reverse('lecture', kwargs={'lecture_id': l1.id, 'lecture_slug': l1.slug})
+		response = c.get(url)
+		self.assertContains(response, 'href="%s"' % url)
+		self.assertNotContains(response, "Code Snippets")
+		self.assertNotContains(response, "Available Quizzes")
+
+		# cached fragments are reused until a generation they are keyed on changes
+		cache.set('%s_list' % generation_key('lecture', 'lecture'), ((LectureRecord.version, []), time.time() + 60), 60)
+		self.assertContains(c.get(url), 'href="%s"' % url)
+		Lecture.objects.create(title="Lecture 2")
+		self.assertContains(c.get(url), "Lecture 2")
+
+		CodeSnippet.objects.create(code="print 1", syntax="python", Lecture=l1)
+		Quiz.objects.create(question="question", visible=True, Lecture=l1)
+		response = c.get(url)
+		self.assertContains(response, "Code Snippets")
+		self.assertContains(response, "Available Quizzes")
+
+
+class App_List_Test(TestCase):
+
+	def tearDown(self):
+		cache.clear()
+
+	def test_memoized(self):
+		from app import context_processors
+		request = RequestFactory().get('/admin')
+		request.user = create_superuser(username="admin", password="admin")
+		apps = context_processors.get_app_list(request)
+		self.assertTrue('App' in [app['name'] for app in apps])
+		# built once per process for each set of permissions
+		self.assertTrue(context_processors.get_app_list(request) is apps)
+		request.user = create_student(username="jack", password="password")
+		self.assertEquals(context_processors.get_app_list(request), [])
+
+
+class Lazy_Context_Test(TestCase):
+
+	def tearDown(self):
+		cache.clear()
+
+	def test_only_read_values_are_computed(self):
+		create_student(username="jack", password="password")
+		l1=Lecture.objects.create(title="Lecture 1")
+		c=Client()
+		response = c.get(reverse('help'))
+		self.assertEquals(response.wsgi_request.__dict__.get('lazy_context_values', {}), {})
+
+		c.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+		response = c.get(reverse('lecture', kwargs={'lecture_id': l1.id, 'lecture_slug': l1.slug}))
+		used = response.wsgi_request.lazy_context_values
+		self.assertEquals(sorted(used.keys()), ['currents', 'django_sessions', 'prepare_confidence_meter_values'])
+		self.assertEquals(used['django_sessions'], 1)
+		self.assertContains(response, "Number of users online: 1")
+
+
+class Code_Render_Test(TestCase):
+
+	def tearDown(self):
+		cache.clear()
+
+	def test_render_code(self):
+		from app.highlighting import get_render_key, recent_renders
+		l1=Lecture.objects.create(title="Lecture 1")
+		snippet=CodeSnippet.objects.create(code="print 1", syntax="python", Lecture=l1)
+		html = snippet.render_code
+		self.assertNotIn("<style", html)
+		key = get_render_key(snippet.code, snippet.syntax, 'default')
+		self.assertEqual(recent_renders[key], html)
+		self.assertEqual(cache.get(key), html)
+
+		# the same code is served from the process cache, then from the shared cache
+		self.assertEqual(snippet.render_code, html)
+		del recent_renders[key]
+		self.assertEqual(snippet.render_code, html)
+
+		# new code is a new key, so it is highlighted again
+		snippet.code = "print 2"
+		self.assertNotEqual(snippet.render_code, html)
+		self.assertNotEqual(get_render_key(snippet.code, snippet.syntax, 'default'), key)
+
+		quiz=Quiz.objects.create(question="question", Lecture=l1, code="")
+		self.assertEqual(quiz.render_code, "")
+
+	def test_stylesheet(self):
+		from app.highlighting import get_stylesheet, get_stylesheet_url
+		create_student(username="jack", password="password")
+		l1=Lecture.objects.create(title="Lecture 1")
+		CodeSnippet.objects.create(code="print 1", syntax="python", Lecture=l1)
+		CodeSnippet.objects.create(code="print 2", syntax="python", Lecture=l1)
+		c=Client()
+		c.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+		url = get_stylesheet_url()
+		response = c.get(reverse('codesnippet', kwargs={'lecture_id': l1.id, 'lecture_slug': l1.slug}))
+		# one link to the shared stylesheet whatever the number of snippets
+		self.assertContains(response, 'href="%s"' % url, count=1)
+
+		response = Client().get(url)
+		self.assertEqual(response.content, get_stylesheet()[0])
+		self.assertIn('max-age=%s' % settings.CODE_STYLESHEET_MAX_AGE, response['Cache-Control'])
+		response = Client().get(reverse('code_stylesheet', kwargs={'style':'default', 'fingerprint':'0'}))
+		self.assertRedirects(response, url)
+		response = Client().get(reverse('code_stylesheet', kwargs={'style':'missing', 'fingerprint':'0'}))
+		self.assertEqual(response.status_code, 404)
+
+
+class Quick_Settings_Test(TestCase):
+
+	def tearDown(self):
+		cache.clear()
+
+	def test_quiz_lists(self):
+		from app.forms import QuickSettingsForm
+		l1=Lecture.objects.create(title="Lecture 1")
+		l2=Lecture.objects.create(title="Lecture 2")
+		q1=Quiz.objects.create(question="question 1", visible=True, Lecture=l1)
+		q2=Quiz.objects.create(question="question 2", visible=False, Lecture=l1)
+		q3=Quiz.objects.create(question="question 3", visible=False, Lecture=l2)
+		form = QuickSettingsForm(session={'quick_lecture': str(l1.id)})
+		self.assertEquals(form.fields['visible_quizzes'].choices, [(q1.id, "question 1")])
+		self.assertEquals(form.fields['invisible_quizzes'].choices, [(q2.id, "question 2")])
+
+		form = QuickSettingsForm(session={})
+		self.assertEquals(form.fields['invisible_quizzes'].choices, [(q3.id, "question 3")])
+		# served from the quiz indexes and records once they are filled
+		with self.assertNumQueries(0):
+			QuickSettingsForm(session={})
+
+		q3.visible = True
+		q3.save()
+		form = QuickSettingsForm(session={})
+		self.assertEquals(form.fields['visible_quizzes'].choices, [(q1.id, "question 1"), (q3.id, "question 3")])
+		self.assertFalse('invisible_quizzes' in form.fields)
+
+
+class Thread_Views_Test(TestCase):
+
+	def tearDown(self):
+		cache.clear()
+
+	def test_views(self):
+		jack=create_student(username="jack", password="password")
+		t1=Thread.objects.create(title="Cars", content="Volvo is a car brand", Creator=jack)
+		t2=Thread.objects.create(title="Books", content="Types of Books", Creator=jack)
+		# hold the flush back so the counters can be seen
+		cache.set('thread_views_flush_due', True, 60)
+		c=Client()
+		c.post(reverse('login'), data={'username': 'jack', 'password': 'password'})
+		for i in xrange(3):
+			c.get(reverse('post', kwargs={'thread_id': t1.id, 'thread_slug': t1.slug}))
+		c.get(reverse('post', kwargs={'thread_id': t2.id, 'thread_slug': t2.slug}))
+		self.assertEquals(Thread.objects.get(id=t1.id).views, 0)
+		self.assertEquals(get_pending_thread_views([t1.id, t2.id]), {t1.id: 3, t2.id: 1})
+		# shown counts include views that are not saved yet
+		response = c.get(reverse('thread'))
+		self.assertEquals(dict((thread.id, thread.views) for thread in response.context['object_list']), {t1.id: 3, t2.id: 1})
+
+		self.assertEquals(flush_thread_views(), 2)
+		self.assertEquals(Thread.objects.get(id=t1.id).views, 3)
+		self.assertEquals(Thread.objects.get(id=t2.id).views, 1)
+		self.assertEquals(get_pending_thread_views([t1.id, t2.id]), {t1.id: 0, t2.id: 0})
+		response = c.get(reverse('thread'))
+		self.assertEquals(dict((thread.id, thread.views) for thread in response.context['object_list']), {t1.id: 3, t2.id: 1})
+
+		# a flush only visits threads viewed since the last one
+		with self.assertNumQueries(0):
+			self.assertEquals(flush_thread_views(), 0)
+		c.get(reverse('post', kwargs={'thread_id': t2.id, 'thread_slug': t2.slug}))
+		self.assertEquals(flush_thread_views(), 1)
+		self.assertEquals(Thread.objects.get(id=t2.id).views, 2)
+
+		# a reply does not write over the saved views
+		Post.objects.create(Thread=get_thread_object(id=t1.id), content="reply", Creator=jack, rank=0)
+		self.assertEquals(Thread.objects.get(id=t1.id).views, 3)
+		self.assertEquals(Thread.objects.get(id=t1.id).replies, 1)
+
+		# only threads that exist are counted
+		self.assertRaises(Thread.DoesNotExist, c.get, reverse('post', kwargs={'thread_id': 999, 'thread_slug': 'missing'}))
+		self.assertEquals(cache.get('thread_views_999'), None)
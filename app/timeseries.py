@@ -0,0 +1,66 @@
+"""
+Confidence meter time series
+fixed size ring buffers of confidence samples kept in cache, one per tier
+the finest tier is sampled once a second, coarser tiers are averaged from the tier below
+tier resolutions and sizes specified in settings.py
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+def get_confidence_trend_tiers():
+	# list of (resolution in seconds, number of slots), finest first
+	return sorted(settings.CONFIDENCE_TREND_TIERS)
+
+def get_confidence_trend_ring(resolution, slots):
+	ring = cache.get('confidence_trend_%s' % resolution)
+	if ring == None or len(ring) != slots:
+		ring = [None] * slots
+	return ring
+
+def store_confidence_trend_sample(resolution, slots, sample):
+	# sample is a tuple of (timestamp, good, neutral, bad)
+	ring = get_confidence_trend_ring(resolution, slots)
+	ring[(sample[0] // resolution) % slots] = sample
+	cache.set('confidence_trend_%s' % resolution, ring, resolution * slots)
+
+def downsample_confidence_trend(resolution, slots, finer_resolution, finer_slots, bucket):
+	# averages the finer samples inside a bucket into a single sample
+	start = bucket * resolution
+	samples = [s for s in get_confidence_trend_ring(finer_resolution, finer_slots) if s != None and start <= s[0] < start + resolution]
+	if not samples:
+		return
+	averages = [round(float(sum(values)) / len(samples), 2) for values in zip(*samples)[1:]]
+	store_confidence_trend_sample(resolution, slots, tuple([start] + averages))
+
+def record_confidence_sample(confidence_meter_data):
+	# called whenever the confidence meter is read, at most one call a second does any work
+	now = int(time.time())
+	tiers = get_confidence_trend_tiers()
+	resolution, slots = tiers[0]
+	if not cache.add('confidence_trend_sampled_%s_%s' % (resolution, now // resolution), True, resolution * 2):
+		return
+	store_confidence_trend_sample(resolution, slots, (
+		now - now % resolution,
+		confidence_meter_data['good_confidence_meter_data'],
+		confidence_meter_data['neutral_confidence_meter_data'],
+		confidence_meter_data['bad_confidence_meter_data'],
+		))
+	# roll up the bucket that has just finished in each coarser tier
+	for (finer_resolution, finer_slots), (resolution, slots) in zip(tiers, tiers[1:]):
+		bucket = now // resolution - 1
+		if cache.add('confidence_trend_sampled_%s_%s' % (resolution, bucket), True, resolution * 2):
+			downsample_confidence_trend(resolution, slots, finer_resolution, finer_slots, bucket)
+
+def get_confidence_trend(resolution, since=0):
+	# samples newer than the since timestamp, oldest first
+	# never more than the number of slots in the tier, whatever since is
+	for tier_resolution, slots in get_confidence_trend_tiers():
+		if tier_resolution == resolution:
+			# slots that have not been written since the ring last wrapped around are stale
+			since = max(since, int(time.time()) - resolution * slots)
+			ring = get_confidence_trend_ring(resolution, slots)
+			return sorted([s for s in ring if s != None and s[0] > since])
+	return []
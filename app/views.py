@@ -9,6 +9,7 @@ from django.shortcuts import render, redirect
 from django.http import HttpRequest, HttpResponseRedirect, HttpResponse
 from django.template import RequestContext
 from django.http import Http404 
+from django.core.urlresolvers import reverse
 from django.contrib.auth import views
 from django.utils.translation import ugettext_lazy as _
 from django.views.generic import TemplateView, View
@@ -16,7 +17,15 @@ from django.contrib.auth import REDIRECT_FIELD_NAME
 from django.contrib.sessions.models import Session
 from django.core.cache import cache
 from django.contrib.sessions.models import Session
-from app.cache_helpers import set_user_confidence
+from django.db import connection
+from django.utils.cache import patch_cache_control
+from pygments.util import ClassNotFound
+from app.cache_helpers import set_current_lecture, get_confidence_meter, get_user_confidence, queue_user_confidence, reset_confidence_votes, update_confidence_meter, rebuild_confidence_meter, get_session_count, filter_quiz_list, get_live_quiz_results, get_quiz_submissions, flush_quiz_answers_if_due
+from app.timeseries import get_confidence_trend, get_confidence_trend_tiers
+from app.presence import remove_presence
+from app.highlighting import get_stylesheet, get_stylesheet_url
+from app.generations import get_generations
+from app.live_updates import publish_live_event, get_live_event_cursor, get_live_events, wait_for_live_events, live_poll_slots
 
 from app.models import *
 from app.forms import ConfidenceMessageForm
@@ -28,6 +37,7 @@ def confidence_message(request):
         form = ConfidenceMessageForm(path=request.path,data=request.POST, instance=request.user.UserProfile)
         if form.is_valid():
             form.save()
+            publish_live_event('confidence_message')
     else:
         form = ConfidenceMessageForm(path=request.path,instance=request.user.UserProfile)
         # redirect back to current page, to make it appear ajaxy
@@ -60,6 +70,12 @@ def dump(request, dump):
     elif dump == 'confidencemeter':
         qs = ConfidenceMeter.objects.all()
         return djqscsv.render_to_csv_response(qs)
+    elif dump == 'confidencevote':
+        qs = ConfidenceVote.objects.all()
+        return djqscsv.render_to_csv_response(qs)
+    elif dump == 'confidencebucket':
+        qs = ConfidenceBucket.objects.all()
+        return djqscsv.render_to_csv_response(qs)
     elif dump == 'thread':
         qs = Thread.objects.all()
         return djqscsv.render_to_csv_response(qs)
@@ -73,8 +89,7 @@ def dump(request, dump):
         qs = Session.objects.all()
         return djqscsv.render_to_csv_response(qs)
     elif dump == 'showsession':
-        qs = [session.get_decoded().get('_auth_user_id') for session in Session.objects.all()]
-        context = {'session_list':User.objects.filter(id__in=qs)}
+        context = {'session_list':User.objects.filter(usersession__isnull=False).distinct()}
         #context = {'session_list':qs}
         return render(request, 'app/show_session.html', context_instance=RequestContext(request, context))
     elif dump == 'flushsession':
@@ -85,8 +100,11 @@ def dump(request, dump):
             u.confidence_message = None
             u.save()
     elif dump == 'resetconfidence':
-        ConfidenceMeter.objects.all().delete()
+        # history is kept in ConfidenceVote, roll what is there up before starting over
+        reset_confidence_votes()
+        ConfidenceBucket.compact()
         ConfidenceMeter.objects.create(User=User.objects.get(username='admin'), confidence=1)
+        rebuild_confidence_meter()
         return render(request, 'app/dump.html')
     else:
         return render(request, 'app/dump.html')
@@ -94,6 +112,18 @@ def dump(request, dump):
 def help(request):
     return render(request, 'app/help.html')
 
+def code_stylesheet(request, style, fingerprint):
+    # colours for highlighted code, the url changes with the css so browsers can keep it for good
+    try:
+        css, current_fingerprint = get_stylesheet(style)
+    except ClassNotFound:
+        raise Http404
+    if fingerprint != current_fingerprint:
+        return redirect(get_stylesheet_url(style))
+    response = HttpResponse(css, content_type=_('text/css'))
+    patch_cache_control(response, public=True, max_age=settings.CODE_STYLESHEET_MAX_AGE)
+    return response
+
 '''generic view for displaying single messages to the user'''
 class AlertView(TemplateView):
     template_name = _("app/alert.html")
@@ -119,15 +149,42 @@ def logout(request, next_page=None,
     user_id = request.user.id
     # perform normal logout operation
     ret_val = views.logout(request, next_page, template_name, redirect_field_name, current_app, extra_context)
+    remove_presence(user_id)
     # remove session entry from db to maintain correct number of session entries since django only clears the contents not the entry
     Session.objects.all().get(session_key=request.session.session_key).delete()
-    for session in Session.objects.all():
-        if session.get_decoded().get('_auth_user_id') == user_id:
-            # sometimes there are multiple sessions for the same user, delete those sessions as well
-            session.delete()
+    # sometimes there are multiple sessions for the same user, delete those sessions as well
+    # found through the UserSession index, deleting a session removes its index entry
+    Session.objects.filter(usersession__User=user_id).delete()
     return ret_val
 
 
+def get_confidence_messages():
+    return [{'user':u.user.__str__(), 'confidence_message':u.confidence_message} for u in UserProfile.objects.select_related('user').exclude(confidence_message__isnull=True).exclude(confidence_message='')]
+
+def get_visible_quizzes():
+    # enough of each quiz for the client to rebuild the sidebar quiz list
+    return [{'id':quiz.id, 'question':quiz.question, 'url':reverse('quiz', args=(quiz.Lecture_id, quiz.Lecture_slug, quiz.id, quiz.slug))} for quiz in filter_quiz_list(visible=True)]
+
+# parts of the page state served by /state/, all of them read from the cache
+STATE_KINDS = ('confidence', 'session_count', 'quiz')
+
+def get_state(request, kinds=STATE_KINDS):
+    # shared by state and live_poll, kinds are live event kinds, see app/live_updates.py
+    # need to import in here to prevent circular imports
+    from app.context_processors import get_confidence_meter_values
+    results = {}
+    if 'confidence' in kinds:
+        results['confidence'] = get_confidence_meter_values(request)
+    if 'session_count' in kinds:
+        # shown in the footer
+        results['session_count'] = get_session_count()
+    if 'quiz' in kinds:
+        results['quiz_version'] = get_generations('quiz_visibility')[0]
+        results['quizzes'] = get_visible_quizzes()
+    if 'confidence_message' in kinds and request.user.is_superuser:
+        results['confidence_messages'] = get_confidence_messages()
+    return results
+
 def admin_poll(request):
     # gets all the polling data for all needs
     if request.is_ajax():
@@ -135,30 +192,135 @@ def admin_poll(request):
         # need to import in here to prevent circular imports
         from app.context_processors import get_confidence_meter_values
         results = get_confidence_meter_values(request)
-        results.update({'confidence_messages':[{'user':u.user.__str__(), 'confidence_message':u.confidence_message} for u in UserProfile.objects.exclude(confidence_message__isnull=True).exclude(confidence_message='')]})
+        results.update({'confidence_messages':get_confidence_messages()})
         return HttpResponse(json.dumps(results), content_type=_('application/json'))
     else:
         #if not ajax request, render index page as they are not supposed to request via non ajax
         raise Http404
         pass
 
+def confidence_trend(request):
+    # samples of the confidence meter for the admin trend graph
+    # clients pass the timestamp of the newest sample they have so only new samples are sent
+    if request.is_ajax():
+        try:
+            resolution = int(request.GET.get('resolution', 1))
+            since = int(request.GET.get('since', 0))
+        except ValueError:
+            raise Http404
+        # reading the meter also records the sample for the current second
+        get_confidence_meter()
+        samples = get_confidence_trend(resolution, since)
+        results = {
+            'resolution': resolution,
+            'slots': dict(get_confidence_trend_tiers()).get(resolution, 0),
+            'samples': samples,
+            'cursor': samples[-1][0] if samples else since,
+        }
+        return HttpResponse(json.dumps(results), content_type=_('application/json'))
+    else:
+        #if not ajax request, render 404 as they are not supposed to request via non ajax
+        raise Http404
+        pass
+
+def quiz_results_live(request, quiz_id):
+    # result counts for the quiz results page, with only the submissions after the client's cursor
+    if request.is_ajax():
+        try:
+            cursor = int(request.GET.get('cursor', 0))
+        except ValueError:
+            raise Http404
+        results = get_live_quiz_results(int(quiz_id))
+        submissions = get_quiz_submissions(int(quiz_id), cursor)
+        results.update({
+            'submissions': [[username, choice if choice != None else answer] for id, username, choice, answer in submissions],
+            'cursor': submissions[-1][0] if submissions else cursor,
+            # a full page may have more submissions behind it, the client asks again from the new cursor
+            'more': len(submissions) == settings.QUIZ_RESULTS_FEED_SIZE,
+        })
+        return HttpResponse(json.dumps(results), content_type=_('application/json'))
+    else:
+        #if not ajax request, render 404 as they are not supposed to request via non ajax
+        raise Http404
+
 def student_poll(request):
     if request.is_ajax():
 
         # need to import in here to prevent circular imports
         from app.context_processors import get_confidence_meter_values
         results = get_confidence_meter_values(request)
-        # if there is a change in the quiz_list by checking length
-        quiz_count = len(Quiz.objects.filter(visible = True))
-        if int(request.GET.get("quiz_length")) != quiz_count:
-            difference = int(request.GET.get("quiz_length")) - quiz_count
-            results.update({'quiz_difference': difference})
+        # clients send the quiz visibility version they last saw, the quiz list is only sent when it has moved
+        quiz_version = get_generations('quiz_visibility')[0]
+        if request.GET.get("quiz_version") == str(quiz_version):
+            results.update({'quiz_unchanged': True})
+        else:
+            results.update({'quiz_version': quiz_version, 'quizzes': get_visible_quizzes()})
         return HttpResponse(json.dumps(results), content_type=_('application/json'))
     else:
         #if not ajax request, render index page as they are not supposed to request via non ajax
         raise Http404
         pass
 
+def state(request):
+    # everything a student page shows outside of its content, in one small response
+    # lets the client update the sidebar and footer without reloading the page
+    if request.is_ajax():
+        return HttpResponse(json.dumps(get_state(request)), content_type=_('application/json'))
+    else:
+        #if not ajax request, render 404 as they are not supposed to request via non ajax
+        raise Http404
+
+def live_poll(request):
+    # long poll, holds the request open until there is a live event to send
+    # the client passes back the cursor of the last response it received
+    if request.is_ajax():
+        # refreshes the online count, which publishes an event if it has changed
+        get_session_count()
+        # every client polls, so queued quiz answers are saved even once submissions stop
+        flush_quiz_answers_if_due()
+        try:
+            cursor = int(request.GET.get('cursor'))
+        except (TypeError, ValueError):
+            # first poll from a page, send everything the page shows
+            cursor = None
+
+        results = {}
+        if cursor == None:
+            current, events = get_live_event_cursor(), None
+        elif live_poll_slots.acquire(False):
+            try:
+                # do not hold on to a db connection while waiting
+                if not connection.in_atomic_block:
+                    connection.close()
+                current, events = wait_for_live_events(cursor, settings.LIVE_POLL_TIMEOUT)
+            finally:
+                live_poll_slots.release()
+        else:
+            # too many requests waiting in this process, answer now and have the client poll again
+            current, events = get_live_events(cursor)
+            results['retry'] = settings.LIVE_POLL_RETRY_INTERVAL*1000
+        results['cursor'] = current
+
+        if events == None:
+            # no events to replay, send the full state instead
+            kinds = set(['confidence', 'confidence_message', 'session_count'])
+            if cursor != None:
+                results['resync'] = True
+        else:
+            kinds = set([kind for kind, data in events])
+            quiz_events = [data for kind, data in events if kind == 'quiz']
+            if quiz_events:
+                results['quiz_events'] = quiz_events
+            quiz_answers = list(set([data['quiz'] for kind, data in events if kind == 'quiz_answer']))
+            if quiz_answers:
+                results['quiz_answers'] = quiz_answers
+        results.update(get_state(request, kinds))
+        return HttpResponse(json.dumps(results), content_type=_('application/json'))
+    else:
+        #if not ajax request, render 404 as they are not supposed to request via non ajax
+        raise Http404
+        pass
+
 def vote(request):
     # voting for the confusion meter
 
@@ -166,8 +328,6 @@ def vote(request):
         user = request.user
         if request.GET.has_key("vote"):
             vote = request.GET.get("vote")
-            # update model
-            confidence_object, created = ConfidenceMeter.objects.get_or_create(User=user)
             # new vote 
             if vote == u'1':
                 confidence = 1
@@ -179,9 +339,11 @@ def vote(request):
                 #all else is neutral
                 confidence = 0
 
-            confidence_object.confidence = confidence
-            confidence_object.save()
-            set_user_confidence(User=user, confidence=confidence)
+            old_confidence = get_user_confidence(User=user)
+            # written to the db later in a batch
+            queue_user_confidence(User=user, confidence=confidence)
+            update_confidence_meter(old_confidence=old_confidence, new_confidence=confidence, seat_location=user.UserProfile.seat_location)
+            publish_live_event('confidence')
         
         # once updated, return results back for html update
         # need to import in here to prevent circular imports
@@ -202,6 +364,7 @@ def quick_update(request):
             # store current lecture in session
             request.session['quick_lecture'] = request.POST.get('lecture')
             lecture = Lecture.objects.get(id=request.POST.get('lecture'))
+            set_current_lecture(lecture)
             response['return_type'] = 'lecture'
             response['return_value'] = request.POST.get('lecture')
             response['notice'] = "Updated Current Lecture to %(lecture)s" % {'lecture':lecture.title}
@@ -60,6 +60,8 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'app.middleware.PresenceMiddleware',
+    'app.middleware.ContextProcessorReportMiddleware',
 )
 
 ROOT_URLCONF = 'lmsunsw.urls'
@@ -242,10 +244,65 @@ THREAD_LIST_CACHE_INTERVAL = 10 # update faster so thread count updates realisti
 POST_LIST_CACHE_INTERVAL = 15 # when there are posts submissions, refresh so response is instantly seen
 QUIZ_LIST_CACHE_INTERVAL = 5
 QUIZCHOICE_LIST_CACHE_INTERVAL = 5
-QUIZCHOICESELECTED_LIST_CACHE_INTERVAL = 5
+ANSWER_STATE_CACHE_INTERVAL = 300 # dropped as soon as the user submits an answer
+QUIZ_RESULTS_COUNTER_TIMEOUT = 300 # live result counters are recounted from the database this often
+QUIZ_RESULTS_FEED_SIZE = 200 # submissions sent per live results response, clients further behind catch up over several
 LECTURE_LIST_CACHE_INTERVAL = 180
 LECTUREMATERIAL_LIST_CACHE_INTERVAL = 15
 CODESNIPPET_LIST_CACHE_INTERVAL = 15
-SESSION_CACHE_INTERVAL = 5
 PERMISSION_CACHE_INTERVAL = 600
-CONFIDENCE_CACHE_INTERVAL = 5
\ No newline at end of file
+CONFIDENCE_CACHE_INTERVAL = 30 # cache holds the latest vote until it is flushed, keep above CONFIDENCE_FLUSH_INTERVAL
+
+# confidence vote write behind settings
+# at most CONFIDENCE_FLUSH_INTERVAL seconds or CONFIDENCE_FLUSH_BATCH_SIZE votes are held only in cache
+CONFIDENCE_FLUSH_INTERVAL = 5
+CONFIDENCE_FLUSH_BATCH_SIZE = 200
+CONFIDENCE_FLUSH_LOCK_TIMEOUT = 10
+CONFIDENCE_QUEUE_TIMEOUT = 300
+
+CONFIDENCE_HISTORY_COMPACT_AFTER = 600 # seconds before raw votes are rolled up into per minute buckets
+
+# confidence trend graph tiers as (seconds per sample, samples kept)
+CONFIDENCE_TREND_TIERS = (
+    (1, 300), # last 5 minutes
+    (10, 360), # last hour
+    (60, 240), # last 4 hours
+)
+
+# quiz answer write behind settings
+# at most QUIZ_ANSWER_FLUSH_INTERVAL seconds or QUIZ_ANSWER_FLUSH_BATCH_SIZE answers are held only in cache
+QUIZ_ANSWER_FLUSH_INTERVAL = 2
+QUIZ_ANSWER_FLUSH_BATCH_SIZE = 100
+QUIZ_ANSWER_FLUSH_LOCK_TIMEOUT = 10
+QUEUE_SLOT_WAIT = 5 # seconds a flush waits for a queue slot whose writer has taken it but not stored it yet
+QUIZ_ANSWER_QUEUE_TIMEOUT = 3600 # far above the flush interval, an answer only expires if nothing flushes for this long
+
+# thread views are counted in cache and added to the db every THREAD_VIEWS_FLUSH_INTERVAL seconds
+THREAD_VIEWS_FLUSH_INTERVAL = 30
+THREAD_VIEWS_FLUSH_LOCK_TIMEOUT = 10
+THREAD_VIEWS_COUNTER_TIMEOUT = 3600 # far above the flush interval, views only expire if nothing flushes for this long
+
+# live update long poll settings
+LIVE_POLL_TIMEOUT = 20 # seconds a long poll waits for an event before returning empty
+LIVE_POLL_SLEEP_INTERVAL = 0.5 # seconds between checks of the event log while waiting
+LIVE_POLL_MAX_WAITERS = 80 # long polls allowed to wait at once per process, keep below the thread count
+LIVE_POLL_RETRY_INTERVAL = 2 # seconds a client waits before polling again when it could not wait
+LIVE_EVENT_BUFFER_SIZE = 100 # events kept for replay, clients further behind resync
+LIVE_EVENT_TIMEOUT = 60
+
+# single flight cache fill, see fill_cache in app/cache_helpers.py
+CACHE_FILL_LEASE = 5 # seconds one process may spend refilling a key before another takes over
+CACHE_FILL_STALE_GRACE = 30 # seconds a stale value is still served while it is being refreshed
+CACHE_FILL_WAIT = 1 # seconds a cold miss waits for another process to fill the key
+CACHE_FILL_WAIT_INTERVAL = 0.05
+
+# presence tracker, see app/presence.py
+PRESENCE_BUCKET_SIZE = 30 # seconds per heartbeat bucket
+PRESENCE_BUCKETS = 4 # users seen in the last this many buckets count as online
+
+FRAGMENT_CACHE_INTERVAL = 600 # cached sidebar and navbar html, turned over by the generation counters
+
+# highlighted code cache, see app/highlighting.py
+CODE_RENDER_CACHE_SIZE = 200 # renders kept in each process
+CODE_RENDER_CACHE_TIMEOUT = 86400
+CODE_STYLESHEET_MAX_AGE = 31536000 # seconds browsers keep a code stylesheet, its url changes with the css
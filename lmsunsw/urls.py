@@ -25,11 +25,15 @@ urlpatterns = patterns('',
 
     url(r'^vote/$', login_required(vote), name='vote'),
     url(r'^admin_poll/$', login_required(admin_poll), name='admin_poll'),
+    url(r'^admin_poll/confidence_trend/$', login_superuser(confidence_trend), name='confidence_trend'),
     url(r'^student_poll/$', login_required(student_poll), name='student_poll'),
+    url(r'^live_poll/$', login_required(live_poll), name='live_poll'),
+    url(r'^state/$', login_required(state), name='state'),
     url(r'^quick_update/$', login_required(quick_update), name='quick_update'),
     url(r'^confidence_message/$', login_required(confidence_message), name='confidence_message'),
 
     url(r'^help/?$', help, name='help'),
+    url(r'^code-style/(?P<style>[\w-]+)/(?P<fingerprint>[0-9a-f]+)\.css$', code_stylesheet, name='code_stylesheet'),
 
     # index page
     url(r'^$', login_required(IndexView.as_view()), name='root'),
@@ -82,6 +86,7 @@ urlpatterns = patterns('',
     # Uncomment the next line to enable the admin:
     url(r'^admin/', include(adminsite.urls)),
     url(r'^admin/quiz-results/?$', login_required(AdminQuizResultsView.as_view()), name='quiz_results'),
+    url(r'^admin/quiz-results/(?P<quiz_id>[0-9]+)/live/?$', login_superuser(quiz_results_live), name='quiz_results_live'),
     url(r'^admin/quiz-results/(?P<quiz_id>.+)/?$', login_required(AdminQuizResultsDetailView.as_view()), name='quiz_results_detail'),
     url(r'^settings/', include(adminsite.urls)),
     url(r'^dump/(?P<dump>.*)$', login_superuser(dump), name='dump'),
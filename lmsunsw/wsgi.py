@@ -12,3 +12,10 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lmsunsw.settings")
 
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
+
+# persist any confidence votes, quiz answers and thread views still waiting in cache when the process exits
+import atexit
+from app.cache_helpers import flush_confidence_votes, flush_quiz_answers, flush_thread_views
+atexit.register(flush_confidence_votes)
+atexit.register(flush_quiz_answers)
+atexit.register(flush_thread_views)